@@ -1,7 +1,12 @@
+import asyncio
+import os
 from contextlib import asynccontextmanager
 
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import httpx
 import uvicorn
 
 from routes import discover, transfer, connections, debug
@@ -12,37 +17,107 @@ from utils.logger import get_logger
 
 logger = get_logger("main")
 
+# AnyIO's default threadpool only allows 40 concurrent sync calls, which sync
+# routes and blocking transfer work can exhaust together (override via env var)
+THREAD_LIMIT = int(os.environ.get("CROSSDROP_THREAD_LIMIT", "200"))
+
+# How often the cached local IP is re-detected to follow network changes
+LOCAL_IP_REFRESH_INTERVAL = 30.0  # seconds
+
+# How often accepted/rejected connection requests past their TTL are pruned
+REQUEST_PRUNE_INTERVAL = 60.0  # seconds
+
+# Outgoing peer notification pool: one keep-alive connection per peer covers the
+# request -> accepted -> disconnect lifecycle without repeated TCP handshakes
+PEER_POOL_LIMITS = httpx.Limits(
+    max_connections=32,
+    max_keepalive_connections=32,
+    keepalive_expiry=30.0,
+)
+
+# Prefer the C-accelerated event loop and HTTP parser when they are installed
+# (uvloop has no Windows build, so fall back to the stdlib implementations there)
+try:
+    import uvloop  # noqa: F401
+    LOOP_IMPL = "uvloop"
+except ImportError:
+    LOOP_IMPL = "asyncio"
+
+try:
+    import httptools  # noqa: F401
+    HTTP_IMPL = "httptools"
+except ImportError:
+    HTTP_IMPL = "h11"
+
 # Global service instances
 discovery_service: DiscoveryService = None
 connection_manager: ConnectionManager = None
 transfer_service: TransferService = None
+http_client: httpx.AsyncClient = None
+
+
+async def refresh_local_ip_loop():
+    """Periodically refresh the cached local IP used by the connection routes"""
+    while True:
+        await asyncio.sleep(LOCAL_IP_REFRESH_INTERVAL)
+        try:
+            connection_manager.refresh_local_ip()
+        except Exception as e:
+            logger.error(f"Error refreshing local IP: {e}")
+
+
+async def prune_requests_loop():
+    """Periodically drop finished connection requests so they don't accumulate"""
+    while True:
+        await asyncio.sleep(REQUEST_PRUNE_INTERVAL)
+        try:
+            pruned = connection_manager.prune_finished_requests()
+            if pruned:
+                logger.info(f"🧹 Pruned {pruned} finished connection request(s)")
+        except Exception as e:
+            logger.error(f"Error pruning connection requests: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
-    global discovery_service, connection_manager, transfer_service
+    global discovery_service, connection_manager, transfer_service, http_client
 
     # Startup
     logger.info("🚀 Starting CrossDrop Backend...")
+    loop = asyncio.get_running_loop()
+    logger.info(f"  ✓ Event loop: {type(loop).__module__}.{type(loop).__name__}")
+
+    to_thread.current_default_thread_limiter().total_tokens = THREAD_LIMIT
+    logger.info(f"  ✓ Threadpool limit set to {THREAD_LIMIT}")
 
     discovery_service = DiscoveryService()
-    discovery_service.start()
+    await discovery_service.start()
     logger.info("  ✓ Discovery service started")
 
     connection_manager = ConnectionManager()
+    refresh_task = asyncio.create_task(refresh_local_ip_loop())
+    prune_task = asyncio.create_task(prune_requests_loop())
     logger.info("  ✓ Connection manager initialized")
 
     transfer_service = TransferService(connection_manager=connection_manager)
-    transfer_service.start()
+    await transfer_service.start()
     logger.info("  ✓ Transfer service started")
 
+    # Shared async client for peer-to-peer notifications (keep-alive pooled)
+    http_client = httpx.AsyncClient(
+        limits=PEER_POOL_LIMITS,
+        timeout=httpx.Timeout(5.0)
+    )
+    logger.info("  ✓ HTTP client initialized")
+
     # Set services for routes
     discover.set_discovery_service(discovery_service)
     transfer.set_transfer_service(transfer_service)
     transfer.set_connection_manager(connection_manager)
     connections.set_connection_manager(connection_manager)
     connections.set_discovery_service_for_connections(discovery_service)
+    connections.set_http_client(http_client)
     debug.set_debug_services(connection_manager, discovery_service)
 
     logger.info("  ✓ All routers registered")
@@ -52,12 +127,17 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("🛑 Shutting down CrossDrop Backend...")
+    refresh_task.cancel()
+    prune_task.cancel()
     discovery_service.stop()
     transfer_service.stop()
+    await connections.cancel_background_tasks()
+    await http_client.aclose()
     logger.info("✅ Shutdown complete")
 
 
-app = FastAPI(title="CrossDrop Backend", lifespan=lifespan)
+# orjson serializes the small, frequently polled JSON payloads much faster than stdlib json
+app = FastAPI(title="CrossDrop Backend", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # CORS middleware for React frontend
 # Allow all origins for LAN access from other devices
@@ -82,5 +162,11 @@ async def root():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Deliberately a single worker: the discovery listener (UDP 8888), the TCP
+    # transfer server (9000) and the in-memory connection/progress state are
+    # per-process singletons. With N workers each process would start its own
+    # services and a pending request stored by one worker would be invisible to
+    # the others. Concurrency comes from the async routes, background peer
+    # notifications and the raised threadpool limit instead.
+    uvicorn.run(app, host="0.0.0.0", port=8000, workers=1, loop=LOOP_IMPL, http=HTTP_IMPL)
 
@@ -1,22 +1,38 @@
 """
 Connection management routes for device connections
 """
-from fastapi import APIRouter, HTTPException
+import asyncio
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from typing import Optional
-import traceback
+from typing import List, Optional, Set, Tuple
+import time
+import httpx
+import orjson
+import random
 
-from utils.connection_manager import ConnectionManager
+from utils.connection_manager import ConnectionManager, format_timestamp
 from utils.discovery_service import DiscoveryService
-from utils.network_utils import get_local_ip
 from utils.logger import get_logger
-from datetime import datetime
+from utils.network_utils import get_local_ip, invalidate_local_ip
+from utils.ttl_cache import TTLCache
 
 logger = get_logger("connections")
 
+
+def _not_initialized(service: str) -> HTTPException:
+    """Error for a route called before main.py wired up the service it needs"""
+    return HTTPException(status_code=500, detail=f"{service} not initialized")
+
+
+# Polled list responses, keyed on the state version so any mutation invalidates them
+_pending_cache = TTLCache(ttl=0.5)
+_connections_cache = TTLCache(ttl=0.5)
+
 # Global instances (will be set by main.py)
 connection_manager: ConnectionManager = None
 discovery_service: DiscoveryService = None
+http_client: httpx.AsyncClient = None
 
 
 def set_connection_manager(manager: ConnectionManager):
@@ -31,6 +47,12 @@ def set_discovery_service_for_connections(service: DiscoveryService):
     discovery_service = service
 
 
+def set_http_client(client: httpx.AsyncClient):
+    """Set the shared HTTP client used for peer-to-peer notifications"""
+    global http_client
+    http_client = client
+
+
 router = APIRouter(prefix="/connections", tags=["connections"])
 
 
@@ -46,6 +68,10 @@ class RejectRequest(BaseModel):
     request_id: str
 
 
+class BroadcastRequest(BaseModel):
+    peer_ips: List[str]
+
+
 class IncomingRequest(BaseModel):
     request_id: str
     from_ip: str
@@ -55,6 +81,185 @@ class IncomingRequest(BaseModel):
     created_at: Optional[str] = None
 
 
+# Strong references to in-flight peer notifications so they are not garbage
+# collected before they finish (the event loop only keeps weak references)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _run_in_background(coro) -> asyncio.Task:
+    """Schedule a peer notification without delaying the HTTP response"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def cancel_background_tasks():
+    """Cancel in-flight peer notifications (called on shutdown)"""
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# UI clients subscribed to /connections/events. Only touched from the event
+# loop, so a plain set is enough
+_event_subscribers: Set[WebSocket] = set()
+
+
+async def _broadcast(event: dict):
+    """Push an event to every subscribed UI client, dropping ones that went away"""
+    data = orjson.dumps(event).decode()
+    for websocket in list(_event_subscribers):
+        try:
+            await websocket.send_text(data)
+        except Exception:
+            _event_subscribers.discard(websocket)
+
+
+def _check_etag(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Attach the ETag to the response, or return a 304 if the client already has it
+
+    The version is read before the data, so a concurrent mutation can only
+    make the ETag stale (forcing a refetch next poll), never hide a change.
+    """
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+    response.headers.update(cache_headers)
+    return None
+
+
+def _backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter, so peers retrying together don't stay in lockstep"""
+    return min(cap, base * (2 ** attempt)) * (0.5 + random.random())
+
+
+async def _post_with_retry(url: str, payload: dict, max_retries: int = 3,
+                           base: float = 0.5, cap: float = 30.0) -> Optional[httpx.Response]:
+    """POST a notification to a peer, retrying unreachable peers and 5xx responses
+    
+    Returns the last response received, or None if the peer never answered.
+    4xx responses and other request errors are not retried.
+    """
+    response = None
+    for attempt in range(max_retries):
+        try:
+            logger.debug("  POST %s (attempt %d/%d)", url, attempt + 1, max_retries)
+            response = await http_client.post(url, json=payload)
+            if response.status_code < 500:
+                return response
+            logger.warning(f"  ⚠ {url} returned {response.status_code} (attempt {attempt + 1})")
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            logger.warning(f"  ✗ Could not reach {url} (attempt {attempt + 1}): {e}")
+        except httpx.HTTPError as e:
+            logger.error(f"  ✗ Request error to {url}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"  ✗ Unexpected error posting to {url}: {e}", exc_info=True)
+            return None
+        
+        if attempt < max_retries - 1:
+            await asyncio.sleep(_backoff_delay(attempt, base, cap))
+    return response
+
+
+async def _deliver_connection_request(peer_ip: str, peer_name: str, payload: dict) -> bool:
+    """Send a connection request to the target device via HTTP with retry"""
+    target_url = connection_manager.peer_url(peer_ip, "incoming-request")
+    logger.info(f"  📡 Attempting to send request to: {target_url}")
+    
+    response = await _post_with_retry(target_url, payload)
+    if response is not None and response.status_code == 200:
+        logger.info(f"  ✅ Connection request successfully delivered to {peer_ip}")
+        return True
+    
+    if response is not None:
+        logger.warning(f"  ⚠ Unexpected status code from {peer_ip}: {response.status_code}")
+    logger.warning(f"  ⚠ Could not deliver request to {peer_name} ({peer_ip})")
+    logger.warning(f"  ℹ Request stored locally. Target device may not receive it.")
+    return False
+
+
+async def _notify_connection_accepted(peer_ip: str, payload: dict) -> bool:
+    """Notify the requesting device that its connection was accepted, with retry"""
+    notify_url = connection_manager.peer_url(peer_ip, "connection-accepted")
+    logger.info(f"📡 Notifying {peer_ip} of connection acceptance...")
+    
+    response = await _post_with_retry(notify_url, payload)
+    if response is not None and response.status_code == 200:
+        logger.info(f"✅ Acceptance notification delivered to {peer_ip}")
+        return True
+    
+    logger.warning(f"⚠ Could not deliver acceptance notification to {peer_ip}")
+    logger.warning(f"   The peer will discover the connection on next poll")
+    return False
+
+
+async def _notify_disconnect(peer_ip: str, payload: dict) -> bool:
+    """Notify the other device that we disconnected (bidirectional cleanup)"""
+    notify_url = connection_manager.peer_url(peer_ip, "disconnect-peer")
+    logger.info(f"📡 Notifying {peer_ip} of disconnection...")
+    
+    response = await _post_with_retry(notify_url, payload)
+    if response is not None and response.status_code == 200:
+        logger.info(f"✅ Disconnection notification delivered to {peer_ip}")
+        return True
+    
+    # Other device might already be offline, that's okay
+    logger.debug(f"Could not notify {peer_ip} of disconnection")
+    return False
+
+
+async def _record_delivery(request_id: str, notification) -> bool:
+    """Await a peer notification and record its outcome on the request as delivered"""
+    delivered = await notification
+    connection_manager.mark_delivered(request_id, delivered)
+    return delivered
+
+
+async def _notify_many(notifier, targets: List[Tuple[str, dict]]):
+    """Send one notification per (peer_ip, payload) concurrently
+
+    Total time is bounded by the slowest peer instead of the sum of all of
+    them. The notifiers handle their own errors, so one unreachable peer
+    does not cancel the others.
+    """
+    async with anyio.create_task_group() as tg:
+        for peer_ip, payload in targets:
+            tg.start_soon(notifier, peer_ip, payload)
+
+
+def _create_outgoing_request(local_ip: str, local_name: str, peer_ip: str, peer_name: str) -> Tuple[str, dict]:
+    """Record a connection request locally and build the payload to send to the peer"""
+    request_id = connection_manager.request_connection(
+        from_ip=local_ip,
+        from_name=local_name,
+        to_ip=peer_ip,
+        to_name=peer_name
+    )
+    logger.info(f"  ✓ Created local request: {request_id}")
+    # Send the peer the same timestamp as the local record instead of taking a new one
+    created_at = format_timestamp(connection_manager.get_request(request_id)["created_at"])
+    
+    return request_id, {
+        "request_id": request_id,
+        "from_ip": local_ip,
+        "from_name": local_name,
+        "to_ip": peer_ip,
+        "to_name": peer_name,
+        "created_at": created_at
+    }
+
+
+async def _send_connection_request(peer_ip: str, payload: dict) -> bool:
+    """Deliver a connection request built by _create_outgoing_request and record the outcome"""
+    return await _record_delivery(
+        payload["request_id"],
+        _deliver_connection_request(peer_ip=peer_ip, peer_name=payload["to_name"], payload=payload)
+    )
+
+
 @router.post("/request")
 async def request_connection(request: ConnectionRequest):
     """Request a connection to a peer device"""
@@ -62,22 +267,21 @@ async def request_connection(request: ConnectionRequest):
     
     if connection_manager is None:
         logger.error("Connection manager not initialized")
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     if discovery_service is None:
         logger.error("Discovery service not initialized")
-        raise HTTPException(status_code=500, detail="Discovery service not initialized")
+        raise _not_initialized("Discovery service")
     
     peer_ip = request.peer_ip
-    local_ip = get_local_ip()
+    local_ip = connection_manager.local_ip
     local_name = discovery_service.device_name
     
     logger.info(f"  From: {local_name} ({local_ip})")
     logger.info(f"  To: {peer_ip}")
     
     # Check if peer is discovered
-    peers = discovery_service.get_peers()
-    peer = next((p for p in peers if p.get("ip") == peer_ip), None)
+    peer = discovery_service.get_peer(peer_ip)
     
     if not peer:
         logger.warning(f"  ✗ Peer {peer_ip} not found in discovered devices")
@@ -96,83 +300,12 @@ async def request_connection(request: ConnectionRequest):
         }
     
     # Create connection request locally first
-    request_id = connection_manager.request_connection(
-        from_ip=local_ip,
-        from_name=local_name,
-        to_ip=peer_ip,
-        to_name=peer_name
-    )
-    logger.info(f"  ✓ Created local request: {request_id}")
+    request_id, payload = _create_outgoing_request(local_ip, local_name, peer_ip, peer_name)
     
-    # Send connection request to target device via HTTP with retry
-    import requests
-    import time as time_module
-
-    target_url = f"http://{peer_ip}:8000/connections/incoming-request"
-    request_delivered = False
-    max_retries = 3
-
-    # Visible console output (like broadcast messages)
-    print(f"📤 Sending connection request to {peer_name} ({peer_ip})")
-    print(f"   Request ID: {request_id}")
-    print(f"   Target URL: {target_url}")
-    logger.info(f"  📡 Attempting to send request to: {target_url}")
-
-    for attempt in range(max_retries):
-        try:
-            print(f"   Attempt {attempt + 1}/{max_retries}...")
-            response = requests.post(
-                target_url,
-                json={
-                    "request_id": request_id,
-                    "from_ip": local_ip,
-                    "from_name": local_name,
-                    "to_ip": peer_ip,
-                    "to_name": peer_name,
-                    "created_at": datetime.now().isoformat()
-                },
-                timeout=5
-            )
-            logger.info(f"  ✓ HTTP POST successful: Status {response.status_code}")
-            logger.debug(f"  Response: {response.text}")
-
-            if response.status_code == 200:
-                print(f"✅ Connection request successfully delivered to {peer_ip}")
-                logger.info(f"  ✅ Connection request successfully delivered to {peer_ip}")
-                request_delivered = True
-                break
-            else:
-                print(f"⚠ Unexpected status code from {peer_ip}: {response.status_code}")
-                logger.warning(f"  ⚠ Unexpected status code: {response.status_code}")
-
-        except requests.exceptions.ConnectionError as e:
-            error_msg = f"✗ Connection failed to {peer_ip}:8000 (attempt {attempt + 1})"
-            print(error_msg)
-            logger.error(f"  {error_msg}: {str(e)}")
-            if attempt < max_retries - 1:
-                time_module.sleep(0.5)  # Wait before retry
-        except requests.exceptions.Timeout as e:
-            error_msg = f"✗ Timeout connecting to {peer_ip}:8000 (attempt {attempt + 1})"
-            print(error_msg)
-            logger.error(f"  {error_msg}")
-            if attempt < max_retries - 1:
-                time_module.sleep(0.5)
-        except requests.exceptions.RequestException as e:
-            error_msg = f"✗ Request error to {peer_ip}: {str(e)}"
-            print(error_msg)
-            logger.error(f"  {error_msg}")
-            break  # Don't retry on other request errors
-        except Exception as e:
-            error_msg = f"✗ Unexpected error sending request: {str(e)}"
-            print(error_msg)
-            logger.error(f"  {error_msg}")
-            logger.error(f"  Error details: {traceback.format_exc()}")
-            break
-
-    if not request_delivered:
-        print(f"⚠ Could not deliver request to {peer_ip} after {max_retries} attempts")
-        print(f"   ℹ Request stored locally. Target device may not receive it.")
-        logger.warning(f"  ℹ Request not delivered - target device may not receive it")
+    # Deliver the request to the target device in the background; the peer also
+    # polls /pending, so the UI does not need to wait for the round trip
+    logger.info(f"  📤 Sending connection request to {peer_name} ({peer_ip})")
+    _run_in_background(_send_connection_request(peer_ip, payload))
     
     logger.info(f"  📋 Request ID: {request_id}")
     return {
@@ -180,68 +313,155 @@ async def request_connection(request: ConnectionRequest):
         "message": f"Connection requested to {peer_name}",
         "request_id": request_id,
         "peer_ip": peer_ip,
-        "peer_name": peer_name,
-        "request_delivered": request_delivered
+        "peer_name": peer_name
     }
 
 
-@router.post("/incoming-request")
-async def receive_incoming_request(request_data: IncomingRequest):
-    """Receive a connection request from another device"""
-    # Visible console output (like broadcast messages)
-    print(f"📥 Received connection request from {request_data.from_name} ({request_data.from_ip})")
-    print(f"   Request ID: {request_data.request_id}")
-    print(f"   To: {request_data.to_name} ({request_data.to_ip})")
+@router.post("/broadcast-request")
+async def broadcast_connection_request(request: BroadcastRequest):
+    """Request connections to several peer devices at once
+    
+    Requests are delivered concurrently, so one slow or offline peer does not
+    hold up the others. Peers that are unknown or already connected are skipped.
+    """
+    if connection_manager is None:
+        raise _not_initialized("Connection manager")
+    
+    if discovery_service is None:
+        raise _not_initialized("Discovery service")
+    
+    local_ip = connection_manager.local_ip
+    local_name = discovery_service.device_name
+    
+    request_ids = {}
+    skipped = []
+    targets = []
+    for peer_ip in dict.fromkeys(request.peer_ips):  # de-duplicate, keep order
+        peer = discovery_service.get_peer(peer_ip)
+        if not peer or connection_manager.is_connected(peer_ip):
+            skipped.append(peer_ip)
+            continue
+        
+        request_id, payload = _create_outgoing_request(
+            local_ip, local_name, peer_ip, peer.get("device_name", "Unknown")
+        )
+        request_ids[peer_ip] = request_id
+        targets.append((peer_ip, payload))
+    
+    logger.info(f"📤 Broadcasting connection request to {len(targets)} peer(s), skipped {len(skipped)}")
+    _run_in_background(_notify_many(_send_connection_request, targets))
+    
+    return {
+        "status": "requested",
+        "message": f"Connection requested to {len(targets)} peer(s)",
+        "request_ids": request_ids,
+        "skipped": skipped
+    }
+
+
+@router.post(
+    "/incoming-request",
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": IncomingRequest.model_json_schema()}},
+            "required": True
+        }
+    }
+)
+async def receive_incoming_request(request: Request):
+    """Receive a connection request from another device
+    
+    This is peer-to-peer traffic, so the body is decoded with orjson and only the
+    fields this handler relies on are checked instead of running full Pydantic
+    validation. IncomingRequest still documents the payload in the OpenAPI schema.
+    """
+    try:
+        request_data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    
+    if not isinstance(request_data, dict):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON object")
+    for field in ("request_id", "from_ip", "to_ip"):
+        value = request_data.get(field)
+        if not isinstance(value, str) or not value:
+            raise HTTPException(status_code=422, detail=f"{field} is required")
+    
+    request_id = request_data["request_id"]
+    from_ip = request_data["from_ip"]
+    to_ip = request_data["to_ip"]
+    # Names are display-only; fall back to the IP rather than storing non-strings
+    from_name = request_data.get("from_name")
+    if not isinstance(from_name, str):
+        from_name = from_ip
+    to_name = request_data.get("to_name")
+    if not isinstance(to_name, str):
+        to_name = to_ip
+    # Stored as-is and formatted on every read, so only accept a string or a number
+    created_at = request_data.get("created_at")
+    if isinstance(created_at, bool) or not isinstance(created_at, (str, int, float)) or not created_at:
+        created_at = time.time()
+    
     logger.info(f"📥 Incoming connection request received")
-    logger.info(f"  Request ID: {request_data.request_id}")
-    logger.info(f"  From: {request_data.from_name} ({request_data.from_ip})")
-    logger.info(f"  To: {request_data.to_name} ({request_data.to_ip})")
+    logger.info(f"  Request ID: {request_id}")
+    logger.info(f"  From: {from_name} ({from_ip})")
+    logger.info(f"  To: {to_name} ({to_ip})")
     
     if connection_manager is None:
         logger.error("Connection manager not initialized")
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
+    # connection_manager.local_ip is only refreshed every 30s, which would
+    # turn away requests addressed to a new IP for that long; get_local_ip()
+    # is cached for 5s, and a mismatch re-resolves it before giving up
     local_ip = get_local_ip()
+    if to_ip != local_ip:
+        invalidate_local_ip()
+        local_ip = get_local_ip()
     
     # Verify this request is for us
-    if request_data.to_ip != local_ip:
-        warning_msg = f"⚠ Request intended for {request_data.to_ip}, but we are {local_ip}"
-        print(warning_msg)
+    if to_ip != local_ip:
+        warning_msg = f"⚠ Request intended for {to_ip}, but we are {local_ip}"
         logger.warning(f"  {warning_msg}")
         return {"status": "ignored", "message": "Request not for this device"}
     
     # Store the incoming request
-    if request_data.request_id:
-        with connection_manager.lock:
-            connection_manager.pending_requests[request_data.request_id] = {
-                "request_id": request_data.request_id,
-                "from_ip": request_data.from_ip,
-                "from_name": request_data.from_name,
-                "to_ip": request_data.to_ip,
-                "to_name": request_data.to_name,
-                "status": "pending",
-                "created_at": request_data.created_at or datetime.now().isoformat()
-            }
-        pending_count = len(connection_manager.pending_requests)
-        success_msg = f"✅ Connection request stored. Total pending: {pending_count}"
-        print(success_msg)
-        print(f"   ⏰ Request will appear in UI modal")
-        logger.info(f"  {success_msg}")
-    else:
-        error_msg = "✗ Invalid request - missing request_id"
-        print(error_msg)
-        logger.error(f"  {error_msg}")
+    pending_request = {
+        "request_id": request_id,
+        "from_ip": from_ip,
+        "from_name": from_name,
+        "to_ip": to_ip,
+        "to_name": to_name,
+        "status": "pending",
+        "created_at": created_at
+    }
+    connection_manager.upsert_pending(pending_request)
+    _run_in_background(_broadcast({
+        "type": "pending",
+        "request": {**pending_request, "created_at": format_timestamp(created_at)}
+    }))
+    pending_count = len(connection_manager.pending_requests)
+    logger.info(f"  ✅ Connection request stored. Total pending: {pending_count}")
     
     return {"status": "received", "message": "Connection request received and stored"}
 
 
 @router.get("/pending")
-async def get_pending_requests():
+async def get_pending_requests(request: Request, response: Response):
     """Get pending connection requests for this device"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     local_ip = get_local_ip()
+    etag = f'W/"p{connection_manager.pending_version}-{local_ip}"'
+    not_modified = _check_etag(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+    
+    return _pending_cache.get_or_compute(etag, lambda: _build_pending_response(local_ip))
+
+
+def _build_pending_response(local_ip: str) -> dict:
     pending = connection_manager.get_pending_requests_for(local_ip)
     
     logger.debug(f"📋 Pending requests query - Found {len(pending)} requests for {local_ip}")
@@ -256,7 +476,7 @@ async def get_pending_requests():
 async def accept_connection(request: AcceptRequest):
     """Accept a connection request"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     request_id = request.request_id
     conn_request = connection_manager.get_request(request_id)
@@ -267,7 +487,7 @@ async def accept_connection(request: AcceptRequest):
     if conn_request["status"] != "pending":
         raise HTTPException(status_code=400, detail=f"Request already {conn_request['status']}")
     
-    local_ip = get_local_ip()
+    local_ip = connection_manager.local_ip
     
     # Accept connection
     success = connection_manager.accept_connection(
@@ -277,54 +497,31 @@ async def accept_connection(request: AcceptRequest):
     )
     
     if success:
-        print(f"✅ Connection accepted from {conn_request['from_name']} ({conn_request['from_ip']})")
-        logger.info(f"✅ Connection accepted from {conn_request['from_name']}")
-
-        # Notify the requesting device that connection was accepted with retry
-        import requests
-        import time
-
-        notify_url = f"http://{conn_request['from_ip']}:8000/connections/connection-accepted"
-        notification_delivered = False
-        max_retries = 3
-
-        for attempt in range(max_retries):
-            try:
-                print(f"📡 Notifying {conn_request['from_ip']} of connection acceptance... (attempt {attempt + 1}/{max_retries})")
-                response = requests.post(
-                    notify_url,
-                    json={
-                        "peer_ip": local_ip,
-                        "peer_name": discovery_service.device_name if discovery_service else "Unknown"
-                    },
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    print(f"✅ Acceptance notification delivered to {conn_request['from_ip']}")
-                    notification_delivered = True
-                    break
-                else:
-                    print(f"⚠ Unexpected status from {conn_request['from_ip']}: {response.status_code}")
-            except requests.exceptions.ConnectionError as e:
-                print(f"⚠ Connection error (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(0.5)  # Wait 500ms before retry
-            except Exception as e:
-                error_msg = f"✗ Could not notify peer of acceptance: {e}"
-                print(error_msg)
-                logger.error(error_msg)
-                break
-
-        if not notification_delivered:
-            print(f"⚠ Could not deliver notification to {conn_request['from_ip']} after {max_retries} attempts")
-            print(f"   The peer will discover the connection on next poll")
+        logger.info(f"✅ Connection accepted from {conn_request['from_name']} ({conn_request['from_ip']})")
+        _run_in_background(_broadcast({
+            "type": "connected",
+            "connection": {
+                "peer_ip": conn_request["from_ip"],
+                "peer_name": conn_request["from_name"],
+                "connected_at": format_timestamp(time.time())
+            }
+        }))
+
+        # Notify the requesting device in the background; it will also
+        # discover the connection on its next poll
+        _run_in_background(_record_delivery(request_id, _notify_connection_accepted(
+            peer_ip=conn_request["from_ip"],
+            payload={
+                "peer_ip": local_ip,
+                "peer_name": discovery_service.device_name if discovery_service else "Unknown"
+            }
+        )))
 
         return {
             "status": "accepted",
             "message": f"Connection accepted with {conn_request['from_name']}",
             "peer_ip": conn_request["from_ip"],
-            "peer_name": conn_request["from_name"],
-            "notification_delivered": notification_delivered
+            "peer_name": conn_request["from_name"]
         }
     else:
         raise HTTPException(status_code=500, detail="Failed to accept connection")
@@ -339,26 +536,32 @@ class ConnectionAcceptedNotification(BaseModel):
 async def receive_connection_accepted(notification: ConnectionAcceptedNotification):
     """Receive notification that a connection was accepted on the other device"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
 
     peer_ip = notification.peer_ip
     peer_name = notification.peer_name
-    local_ip = get_local_ip()
+    local_ip = connection_manager.local_ip
 
-    print(f"📥 Received connection acceptance notification from {peer_name} ({peer_ip})")
     logger.info(f"📥 Connection acceptance received from {peer_name} ({peer_ip})")
 
     # Only store the peer's connection, not our own IP
     # Each device should only track connections TO other devices, not to itself
-    with connection_manager.lock:
-        connection_manager.connections[peer_ip] = {
+    connected_at = time.time()
+    connection_manager.upsert_connection({
+        "peer_ip": peer_ip,
+        "peer_name": peer_name,
+        "connected_at": connected_at,
+        "status": "connected"
+    })
+    _run_in_background(_broadcast({
+        "type": "connected",
+        "connection": {
             "peer_ip": peer_ip,
             "peer_name": peer_name,
-            "connected_at": datetime.now().isoformat(),
-            "status": "connected"
+            "connected_at": format_timestamp(connected_at)
         }
+    }))
 
-    print(f"✅ Connection established with {peer_name} ({peer_ip})")
     logger.info(f"✅ Connection established with {peer_name} ({peer_ip})")
 
     return {"status": "updated", "message": f"Connected to {peer_name}"}
@@ -368,7 +571,7 @@ async def receive_connection_accepted(notification: ConnectionAcceptedNotificati
 async def reject_connection(request: RejectRequest):
     """Reject a connection request"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     request_id = request.request_id
     conn_request = connection_manager.get_request(request_id)
@@ -377,9 +580,9 @@ async def reject_connection(request: RejectRequest):
     
     if success:
         if conn_request:
-            print(f"🚫 Connection request rejected from {conn_request.get('from_name', 'Unknown')} ({conn_request.get('from_ip', 'Unknown')})")
-            print(f"   Request ID: {request_id}")
+            logger.info(f"🚫 Connection request rejected from {conn_request.get('from_name', 'Unknown')} ({conn_request.get('from_ip', 'Unknown')})")
         logger.info(f"🚫 Connection request {request_id} rejected")
+        _run_in_background(_broadcast({"type": "rejected", "request_id": request_id}))
         return {
             "status": "rejected",
             "message": "Connection request rejected"
@@ -389,14 +592,21 @@ async def reject_connection(request: RejectRequest):
 
 
 @router.get("/list")
-async def get_connections():
+async def get_connections(request: Request, response: Response):
     """Get list of connected devices (excluding local device)"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
-    from utils.network_utils import get_local_ip
     local_ip = get_local_ip()
+    etag = f'W/"c{connection_manager.connections_version}-{local_ip}"'
+    not_modified = _check_etag(request, response, etag)
+    if not_modified is not None:
+        return not_modified
     
+    return _connections_cache.get_or_compute(etag, lambda: _build_connections_response(local_ip))
+
+
+def _build_connections_response(local_ip: str) -> dict:
     # Exclude local IP from connections list
     connections = connection_manager.get_connections(exclude_ip=local_ip)
     
@@ -410,39 +620,18 @@ async def get_connections():
 async def disconnect(request: ConnectionRequest):
     """Disconnect from a peer"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     peer_ip = request.peer_ip
-    local_ip = get_local_ip()
-    
-    # Get peer info before disconnecting
-    peer_info = None
-    with connection_manager.lock:
-        if peer_ip in connection_manager.connections:
-            peer_info = connection_manager.connections[peer_ip]
+    local_ip = connection_manager.local_ip
     
     # Disconnect locally
     connection_manager.disconnect(peer_ip)
-    print(f"🔌 Disconnected from {peer_ip}")
+    _run_in_background(_broadcast({"type": "disconnected", "peer_ip": peer_ip}))
     logger.info(f"🔌 Disconnected from {peer_ip}")
     
     # Notify the other device to disconnect as well (bidirectional)
-    import requests
-    try:
-        notify_url = f"http://{peer_ip}:8000/connections/disconnect-peer"
-        print(f"📡 Notifying {peer_ip} of disconnection...")
-        response = requests.post(
-            notify_url,
-            json={"peer_ip": local_ip},
-            timeout=5
-        )
-        if response.status_code == 200:
-            print(f"✅ Disconnection notification delivered to {peer_ip}")
-        else:
-            print(f"⚠ Failed to notify {peer_ip}: Status {response.status_code}")
-    except Exception as e:
-        # Other device might already be offline, that's okay
-        logger.debug(f"Could not notify peer of disconnection: {e}")
+    _run_in_background(_notify_disconnect(peer_ip=peer_ip, payload={"peer_ip": local_ip}))
     
     return {
         "status": "disconnected",
@@ -455,22 +644,44 @@ async def disconnect(request: ConnectionRequest):
 async def disconnect_peer(notification: dict):
     """Receive disconnection notification from another device (bidirectional cleanup)"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     peer_ip = notification.get("peer_ip")
     if peer_ip:
         connection_manager.disconnect(peer_ip)
-        print(f"🔌 Peer {peer_ip} disconnected (bidirectional cleanup)")
+        _run_in_background(_broadcast({"type": "disconnected", "peer_ip": peer_ip}))
         logger.info(f"🔌 Peer {peer_ip} disconnected (bidirectional cleanup)")
     
     return {"status": "disconnected"}
 
 
+@router.websocket("/events")
+async def connection_events(websocket: WebSocket):
+    """Stream connection events to the UI instead of making it poll
+    
+    Events are JSON objects with a "type" of "pending" (incoming request),
+    "connected" (either side accepted a request), "rejected" (we rejected
+    a request) or "disconnected" (either side disconnected).
+    /pending and /list remain available for the initial state and for
+    clients that don't use the socket.
+    """
+    await websocket.accept()
+    _event_subscribers.add(websocket)
+    try:
+        while True:
+            # Clients don't send anything; this just waits for the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _event_subscribers.discard(websocket)
+
+
 @router.get("/status/{peer_ip}")
 async def get_connection_status(peer_ip: str):
     """Get connection status with a specific peer"""
     if connection_manager is None:
-        raise HTTPException(status_code=500, detail="Connection manager not initialized")
+        raise _not_initialized("Connection manager")
     
     is_connected = connection_manager.is_connected(peer_ip)
     
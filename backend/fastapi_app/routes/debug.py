@@ -5,6 +5,10 @@ from fastapi import APIRouter
 from utils.connection_manager import ConnectionManager
 from utils.discovery_service import DiscoveryService
 from utils.network_utils import get_local_ip
+from utils.ttl_cache import TTLCache
+
+# The debug view is polled like the others; briefly reuse the last snapshot
+_status_cache = TTLCache(ttl=0.5)
 
 # Global instances
 connection_manager: ConnectionManager = None
@@ -25,25 +29,38 @@ router = APIRouter(prefix="/debug", tags=["debug"])
 async def debug_status():
     """Get comprehensive debug status"""
     local_ip = get_local_ip()
+    return _status_cache.get_or_compute(local_ip, lambda: _build_status(local_ip))
+
+
+def _build_status(local_ip: str) -> dict:
+    peers = discovery_service.get_peers() if discovery_service else []
     
     status = {
         "local_ip": local_ip,
         "device_name": discovery_service.device_name if discovery_service else "Unknown",
         "discovery": {
             "running": discovery_service.running if discovery_service else False,
-            "peers_count": len(discovery_service.get_peers()) if discovery_service else 0,
-            "peers": discovery_service.get_peers() if discovery_service else []
+            "peers_count": len(peers),
+            "peers": peers
         },
-        "connections": {
-            "all": list(connection_manager.connections.values()) if connection_manager else [],
-            "count": len(connection_manager.connections) if connection_manager else 0
-        } if connection_manager else {},
-        "pending_requests": {
-            "all": list(connection_manager.pending_requests.values()) if connection_manager else [],
-            "for_this_device": connection_manager.get_pending_requests_for(local_ip) if connection_manager else [],
-            "count": len(connection_manager.get_pending_requests_for(local_ip)) if connection_manager else 0
-        } if connection_manager else {}
+        "connections": {},
+        "pending_requests": {}
     }
     
+    if connection_manager:
+        connections, pending_requests = connection_manager.snapshot()
+        for_this_device = [
+            request for request in pending_requests
+            if request["to_ip"] == local_ip and request["status"] == "pending"
+        ]
+        status["connections"] = {
+            "all": connections,
+            "count": len(connections)
+        }
+        status["pending_requests"] = {
+            "all": pending_requests,
+            "for_this_device": for_this_device,
+            "count": len(for_this_device)
+        }
+    
     return status
-
@@ -4,6 +4,7 @@ Device discovery routes for LAN-based device discovery
 from fastapi import APIRouter
 from utils.discovery_service import DiscoveryService
 from utils.logger import get_logger
+from utils.network_utils import get_local_ip
 
 logger = get_logger("discover")
 
@@ -32,6 +33,8 @@ async def get_peers():
     if discovery_service is None:
         return {"error": "Discovery service not initialized", "peers": []}
     
+    # get_peers() returns a shared snapshot that is rebuilt only when the
+    # peer set changes, so polling this needs no cache of its own
     peers = discovery_service.get_peers()
     return {"peers": peers, "count": len(peers)}
 
@@ -43,7 +46,6 @@ async def discovery_status():
         return {"status": "inactive", "error": "Discovery service not initialized"}
     
     # Refresh local IP to handle network changes
-    from utils.network_utils import get_local_ip
     current_local_ip = get_local_ip()
     
     # Update discovery service's local IP if it changed
@@ -68,7 +70,7 @@ async def start_discovery():
     if discovery_service.running:
         return {"status": "already_running", "message": "Discovery is already running"}
     
-    discovery_service.start()
+    await discovery_service.start()
     return {
         "status": "started",
         "message": "Device discovery started",
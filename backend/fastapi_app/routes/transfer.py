@@ -1,24 +1,39 @@
 """
 File transfer routes for TCP socket-based file sharing
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from starlette.concurrency import run_in_threadpool
+import anyio
+import functools
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 import os
+import stat
 import time
 from pathlib import Path
 
 from utils.file_handler import (
     send_file, 
-    send_file_from_stream, 
     send_file_chunked_streaming,
+    send_file_from_fileobj,
     log_transfer,
-    LARGE_FILE_THRESHOLD
+    read_transfer_logs,
+    TRANSFER_LOG_FILE
 )
 from utils.transfer_service import TransferService
 from utils.network_utils import get_local_ip
-from utils.transfer_progress import progress_tracker
-import uuid
+from utils.transfer_progress import progress_tracker, new_transfer_id
+from utils.logger import get_logger
+
+logger = get_logger("transfer")
+
+# Parsed transfer history, reused until the log file's (mtime, size) changes
+_history_cache: Dict = {"key": None, "data": None}
+
+# Cap on blocking socket transfers running in worker threads at once, so a
+# burst of sends can't take every threadpool slot from the sync routes
+MAX_CONCURRENT_TRANSFERS = 8
+_transfer_limiter: Optional[anyio.CapacityLimiter] = None
 
 # Global transfer service instance (will be set by main.py)
 transfer_service: TransferService = None
@@ -40,6 +55,77 @@ def set_connection_manager(manager):
 router = APIRouter(prefix="/transfer", tags=["transfer"])
 
 
+def _local_ip() -> str:
+    """This device's IP: the connection manager's periodically refreshed copy when
+    available, otherwise the TTL-cached lookup"""
+    if connection_manager is not None:
+        return connection_manager.local_ip
+    return get_local_ip()
+
+
+def _upload_fileno(file: UploadFile) -> Optional[int]:
+    """File descriptor of the upload's spool file, or None if it has no real fd
+
+    Starlette spools uploads to a SpooledTemporaryFile; calling fileno() rolls
+    it over to disk if it was still in memory.
+    """
+    try:
+        return file.file.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+async def _run_transfer(func, *args, **kwargs):
+    """Run a blocking send function in a worker thread, limited to
+    MAX_CONCURRENT_TRANSFERS at once"""
+    global _transfer_limiter
+    if _transfer_limiter is None:
+        # Created lazily: anyio needs a running event loop to build the limiter
+        _transfer_limiter = anyio.CapacityLimiter(MAX_CONCURRENT_TRANSFERS)
+    return await anyio.to_thread.run_sync(
+        functools.partial(func, *args, **kwargs),
+        limiter=_transfer_limiter
+    )
+
+
+class _SizeTrackingUpload:
+    """Wraps an UploadFile and counts the bytes read from it"""
+    
+    def __init__(self, upload_file: UploadFile):
+        self.upload_file = upload_file
+        self.total_bytes = 0
+    
+    async def read(self, size: int) -> bytes:
+        chunk = await self.upload_file.read(size)
+        if chunk:
+            self.total_bytes += len(chunk)
+        return chunk
+
+
+class _RequestBodyReader:
+    """Exposes a raw request body stream through the async read(size) interface
+    send_file_chunked_streaming() expects, counting the bytes read"""
+    
+    def __init__(self, request: Request):
+        self._stream = request.stream()
+        self._buffer = bytearray()
+        self._eof = False
+        self.total_bytes = 0
+    
+    async def read(self, size: int) -> bytes:
+        # Coalesce the small body messages from the server into chunks of up to
+        # `size` bytes, so the TCP side makes fewer, larger sendall() calls
+        while not self._eof and len(self._buffer) < size:
+            try:
+                self._buffer += await self._stream.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.total_bytes += len(chunk)
+        return chunk
+
+
 class SendFileRequest(BaseModel):
     target_ip: str
     file_path: str
@@ -71,20 +157,23 @@ async def send_file_endpoint(request: SendFileRequest):
                 detail=f"Not connected to {target_ip}. You must accept a connection request before sending files."
             )
     
-    if not os.path.exists(file_path):
+    # One stat() for existence, type and size
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
     
-    if not os.path.isfile(file_path):
+    if not stat.S_ISREG(st.st_mode):
         raise HTTPException(status_code=400, detail=f"Path is not a file: {file_path}")
     
-    local_ip = get_local_ip()
+    local_ip = _local_ip()
     filename = Path(file_path).name
-    file_size = os.path.getsize(file_path)
+    file_size = st.st_size
     
     start_time = time.time()
     
     try:
-        success = send_file(target_ip, file_path)
+        success = await _run_transfer(send_file, target_ip, file_path)
         duration = time.time() - start_time
         
         if success:
@@ -160,14 +249,20 @@ async def send_file_upload(
                 detail=f"Not connected to {target_ip}. You must accept a connection request before sending files."
             )
     
-    local_ip = get_local_ip()
+    local_ip = _local_ip()
     filename = file.filename or "unnamed_file"
     
+    # The upload is fully spooled by the time we get here; when the spool has a
+    # real fd its size is exact and it can be sent with sendfile(2)
+    spool_fd = _upload_fileno(file)
+    
     # Get file size from Content-Length header if available, otherwise read file
     file_size = 0
     try:
+        if spool_fd is not None:
+            file_size = os.fstat(spool_fd).st_size
         # Try to get size from Content-Length header (more efficient)
-        if hasattr(file, 'size') and file.size:
+        elif hasattr(file, 'size') and file.size:
             file_size = file.size
         elif hasattr(file, 'headers'):
             content_length = file.headers.get('content-length')
@@ -180,7 +275,7 @@ async def send_file_upload(
         start_time = time.time()
         
         # Create transfer ID for progress tracking
-        transfer_id = str(uuid.uuid4())
+        transfer_id = new_transfer_id()
         progress_tracker.create_transfer(
             transfer_id=transfer_id,
             direction='send',
@@ -190,83 +285,52 @@ async def send_file_upload(
             file_size=file_size
         )
         
-        # Progress callback
-        def update_send_progress(bytes_sent: int):
-            progress_tracker.update_progress(transfer_id, bytes_sent)
+        # Progress callback, coalesced so fast transfers don't hammer the tracker lock
+        update_send_progress = progress_tracker.throttled_updater(transfer_id)
         
         # Socket storage callback for cancellation
         def store_socket(sock):
             progress_tracker.set_socket(transfer_id, sock)
         
         # Adaptive approach: use different methods based on file size
-        if file_size > LARGE_FILE_THRESHOLD:
-            # Large files (>100MB): Use optimized chunked streaming
-            # This uses constant memory (~64KB-128KB) regardless of file size
-            print(f"📦 Large file detected ({file_size / (1024*1024):.2f} MB). Using optimized chunked streaming...")
+        if spool_fd is not None:
+            if file_size == 0:
+                progress_tracker.remove_transfer(transfer_id)
+                raise HTTPException(status_code=400, detail="Cannot send empty file")
             
-            # Stream directly from upload to TCP socket (no full file in memory)
-            success = await send_file_chunked_streaming(
+            # Zero-copy: sendfile() from the spool file straight to the TCP socket
+            success = await _run_transfer(
+                send_file_from_fileobj,
                 target_ip=target_ip,
-                file_upload=file,
+                file_obj=file.file,
                 filename=filename,
                 file_size=file_size,
                 progress_callback=update_send_progress,
                 socket_store_callback=store_socket
             )
-        elif file_size == 0:
-            # Unknown file size: Use chunked streaming as safe default
-            # We'll count bytes as we stream and update file_size for logging
-            print(f"📦 File size unknown. Using optimized chunked streaming...")
-            
-            # Create wrapper to track actual size during streaming
-            class SizeTrackingUploadFile:
-                def __init__(self, upload_file):
-                    self.upload_file = upload_file
-                    self.total_bytes = 0
-                
-                async def read(self, size):
-                    chunk = await self.upload_file.read(size)
-                    if chunk:
-                        self.total_bytes += len(chunk)
-                    return chunk
-            
-            tracking_file = SizeTrackingUploadFile(file)
+        else:
+            # No real fd to send from: stream the upload in chunks whatever its
+            # size, so memory stays constant instead of reading it all at once.
+            # The tracker counts bytes in case the size wasn't reported.
+            logger.info(f"📦 Streaming upload in chunks ({file_size / (1024*1024):.2f} MB reported)...")
+            tracking_file = _SizeTrackingUpload(file)
             
             success = await send_file_chunked_streaming(
                 target_ip=target_ip,
                 file_upload=tracking_file,
                 filename=filename,
-                file_size=0,  # Unknown, will stream until EOF
+                file_size=file_size,  # 0 = unknown, stream until EOF
                 progress_callback=update_send_progress,
                 socket_store_callback=store_socket
             )
             
-            # Update file_size for logging and progress tracker
-            file_size = tracking_file.total_bytes
-            progress_tracker.update_progress(transfer_id, file_size)
-        else:
-            # Small files (<100MB): Use fast in-memory approach
-            # Read entire file into memory (fast for small files)
-            file_content = await file.read()
-            file_size = len(file_content)
-            
             if file_size == 0:
-                progress_tracker.remove_transfer(transfer_id)
-                raise HTTPException(status_code=400, detail="Cannot send empty file")
-            
-            # Update progress tracker with actual file size
-            progress_tracker.update_progress(transfer_id, file_size)
-            
-            # Send from memory (fast for small files, no overhead)
-            success = send_file_from_stream(
-                target_ip=target_ip,
-                file_stream=file_content,
-                filename=filename,
-                file_size=file_size,
-                use_optimized=False,  # Use standard chunk size for small files
-                progress_callback=update_send_progress,
-                socket_store_callback=store_socket
-            )
+                # Update file_size for logging and progress tracker
+                file_size = tracking_file.total_bytes
+                if file_size == 0:
+                    progress_tracker.remove_transfer(transfer_id)
+                    raise HTTPException(status_code=400, detail="Cannot send empty file")
+                progress_tracker.update_progress(transfer_id, file_size)
         
         duration = time.time() - start_time
         
@@ -323,17 +387,104 @@ async def send_file_upload(
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+@router.post("/send-stream")
+async def send_file_stream(request: Request, target_ip: str, filename: str):
+    """
+    Forward a raw request body straight to the target device's TCP socket
+    
+    The body is the file itself (not multipart form data) and Content-Length
+    must give its size; target_ip and filename are query parameters. Bytes are
+    relayed as they arrive from the browser, so nothing is spooled to disk or
+    held in memory and the TCP transfer overlaps the HTTP upload.
+    """
+    if not target_ip or target_ip.strip() == "":
+        raise HTTPException(status_code=400, detail="target_ip is required")
+    
+    # SECURITY: Only allow sending to connected peers
+    if connection_manager:
+        if not connection_manager.is_connected(target_ip):
+            raise HTTPException(
+                status_code=403,
+                detail=f"Not connected to {target_ip}. You must accept a connection request before sending files."
+            )
+    
+    # The receiver needs the exact size up front, before any data is streamed
+    try:
+        file_size = int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=411, detail="Content-Length is required")
+    if file_size == 0:
+        raise HTTPException(status_code=400, detail="Cannot send empty file")
+    
+    local_ip = _local_ip()
+    filename = Path(filename).name or "unnamed_file"
+    start_time = time.time()
+    
+    transfer_id = new_transfer_id()
+    progress_tracker.create_transfer(
+        transfer_id=transfer_id,
+        direction='send',
+        sender_ip=local_ip,
+        receiver_ip=target_ip,
+        filename=filename,
+        file_size=file_size
+    )
+    
+    def store_socket(sock):
+        progress_tracker.set_socket(transfer_id, sock)
+    
+    try:
+        success = await send_file_chunked_streaming(
+            target_ip=target_ip,
+            file_upload=_RequestBodyReader(request),
+            filename=filename,
+            file_size=file_size,
+            progress_callback=progress_tracker.throttled_updater(transfer_id),
+            socket_store_callback=store_socket
+        )
+    except Exception as e:
+        logger.error(f"Error streaming {filename} to {target_ip}: {e}")
+        success = False
+    
+    duration = time.time() - start_time
+    log_transfer(
+        sender_ip=local_ip,
+        receiver_ip=target_ip,
+        filename=filename,
+        file_size=file_size,
+        duration=duration,
+        status="success" if success else "failed"
+    )
+    
+    if not success:
+        progress_tracker.fail_transfer(transfer_id)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to send file to {target_ip}. Check if receiver is listening."
+        )
+    
+    progress_tracker.complete_transfer(transfer_id)
+    return {
+        "status": "success",
+        "message": f"File sent successfully to {target_ip}",
+        "filename": filename,
+        "file_size": file_size,
+        "duration_seconds": round(duration, 2),
+        "target_ip": target_ip
+    }
+
+
 @router.get("/receive")
 async def start_receive():
     """
-    Start the TCP file transfer server (runs in background thread)
+    Start the TCP file transfer server (accepts on the event loop)
     Returns status of the receiver
     """
     if transfer_service is None:
         raise HTTPException(status_code=500, detail="Transfer service not initialized")
     
     if not transfer_service.running:
-        transfer_service.start()
+        await transfer_service.start()
     
     return {
         "status": "active" if transfer_service.running else "inactive",
@@ -346,25 +497,28 @@ async def start_receive():
 
 @router.get("/history")
 async def transfer_history():
-    """Get transfer history (logged in JSON)"""
-    import json
-    from pathlib import Path
-    
-    log_file = Path("logs/transfer_logs.json")
-    
-    if not log_file.exists():
-        return {"transfers": [], "total": 0}
+    """Get transfer history (logged as NDJSON)"""
+    log_file = Path("logs") / TRANSFER_LOG_FILE
     
     try:
-        with open(log_file, 'r') as f:
-            data = json.load(f)
-            transfers = data.get('transfers', [])
-            
-        return {
+        try:
+            st = log_file.stat()
+            key = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            key = None  # Nothing logged yet, or an old-format log still to migrate
+        if key is not None and _history_cache["key"] == key:
+            return _history_cache["data"]
+        
+        transfers = await run_in_threadpool(read_transfer_logs)
+        history = {
             "transfers": transfers,
             "total": len(transfers),
-            "updated_at": data.get('updated_at', '')
+            "updated_at": transfers[-1].get('timestamp', '') if transfers else ''
         }
+        if key is not None:
+            _history_cache["key"] = key
+            _history_cache["data"] = history
+        return history
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading transfer logs: {str(e)}")
 
@@ -399,16 +553,12 @@ async def transfer_status():
 async def get_transfer_progress(local_ip: str = None):
     """Get current transfer progress for sending or receiving"""
     if not local_ip:
-        local_ip = get_local_ip()
-    
-    # Get all active transfers for this IP (both sending and receiving)
-    # Filter out cancelled and completed transfers - only return active ones
-    all_sending = progress_tracker.get_transfers_by_ip(local_ip, direction='send')
-    all_receiving = progress_tracker.get_transfers_by_ip(local_ip, direction='receive')
+        local_ip = _local_ip()
     
-    # Only return active transfers (not cancelled, completed, or failed)
-    sending = [t for t in all_sending if t.get('status') == 'active']
-    receiving = [t for t in all_receiving if t.get('status') == 'active']
+    # Only active transfers (not cancelled, completed, or failed) for this IP,
+    # read from the tracker's index instead of filtering every transfer
+    sending = progress_tracker.get_active_transfers(local_ip, 'send')
+    receiving = progress_tracker.get_active_transfers(local_ip, 'receive')
 
     return {
         "sending": sending,
@@ -82,8 +82,8 @@ def main():
     print(f"\n📍 Your local IP: {local_ip}")
     
     if len(sys.argv) < 2:
-        print("\nUsage: python test_connection.py <target_ip>")
-        print("Example: python test_connection.py 10.7.11.246")
+        print("\nUsage: python -m tests.test_connection <target_ip>")
+        print("Example: python -m tests.test_connection 10.7.11.246")
         sys.exit(1)
     
     target_ip = sys.argv[1]
@@ -1,22 +1,120 @@
 """
 Connection manager for managing device connections
 """
+import functools
+import itertools
+import logging
+import os
 import threading
-from typing import Dict, Optional, Set
+import time
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime
 from utils.logger import get_logger
+from utils.network_utils import get_local_ip, invalidate_local_ip
 
 logger = get_logger("connection_manager")
 
 
+def format_timestamp(value) -> str:
+    """Format a stored time.time() value as an ISO string for API responses
+
+    Timestamps are kept as floats on the write path and only formatted when
+    surfaced, at second precision (nothing displays sub-second times). Strings
+    (e.g. created_at supplied by a peer) pass through as-is, and any other
+    value is shown with str() so it never reaches (and breaks) the cache.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _format_epoch(value)
+    return str(value)
+
+
+@functools.lru_cache(maxsize=256)
+def _format_epoch(value: float) -> str:
+    """Cached formatting; stored timestamps never change, so every poll after the first hits"""
+    try:
+        return datetime.fromtimestamp(value).isoformat(timespec="seconds")
+    except (OverflowError, OSError, ValueError):
+        return str(value)
+
+
+_TIMESTAMP_FIELDS = ("created_at", "accepted_at", "rejected_at", "connected_at")
+
+
+def _with_formatted_timestamps(entry: Dict) -> Dict:
+    """Copy of a stored entry with every timestamp field formatted"""
+    return {key: format_timestamp(value) if key in _TIMESTAMP_FIELDS else value for key, value in entry.items()}
+
+
 class ConnectionManager:
     """Manages connections between devices"""
     
+    PEER_API_PORT = 8000
+    FINISHED_REQUEST_TTL = 300.0  # seconds an accepted/rejected request is kept before pruning
+    
     def __init__(self):
+        # Both maps are copy-on-write: writers replace the whole dict under the
+        # matching lock, so readers use the current reference without locking
         self.connections: Dict[str, Dict] = {}  # peer_ip -> connection info
         self.pending_requests: Dict[str, Dict] = {}  # request_id -> request info
-        self.lock = threading.Lock()
-        self.request_counter = 0
+        # to_ip -> {request_id: request} for requests still pending; copy-on-write
+        # alongside pending_requests so polls read only their own requests
+        self._pending_by_to_ip: Dict[str, Dict[str, Dict]] = {}
+        # The locks only serialize writers. Separate locks so request traffic
+        # never waits on connection updates; they stay threading locks because
+        # the transfer service's socket threads read this state too.
+        # Lock order when both are needed: pending_lock, then connections_lock.
+        self.pending_lock = threading.Lock()
+        self.connections_lock = threading.Lock()
+        self._request_counter = itertools.count(1)  # next() is atomic under the GIL
+        # Request IDs are stored by peers too, so they need a per-process random
+        # part to stay unique across devices and restarts without a timestamp
+        self._request_id_prefix = f"req_{os.urandom(4).hex()}_"
+        # Bumped under the matching lock on every mutation; used as ETags by the polling routes
+        self.pending_version = 0
+        self.connections_version = 0
+        self.local_ip = get_local_ip()  # Cached; refreshed periodically by main.py
+        self._peer_urls: Dict[str, Dict[str, str]] = {}  # peer_ip -> path -> URL
+    
+    def refresh_local_ip(self) -> str:
+        """Re-detect the local IP address to handle network changes"""
+        invalidate_local_ip()
+        current_ip = get_local_ip()
+        if current_ip != self.local_ip:
+            logger.info(f"🔄 Local IP changed from {self.local_ip} to {current_ip}")
+            self.local_ip = current_ip
+        return current_ip
+    
+    def peer_url(self, ip: str, path: str) -> str:
+        """Get the URL of a peer's /connections/{path} endpoint (memoized per peer)"""
+        urls = self._peer_urls.get(ip)
+        if urls is None:
+            urls = self._peer_urls[ip] = {}
+        url = urls.get(path)
+        if url is None:
+            url = urls[path] = f"http://{ip}:{self.PEER_API_PORT}/connections/{path}"
+        return url
+    
+    def _store_pending(self, request: Dict):
+        """Swap in a new or updated request and keep the to_ip index in step (must hold pending_lock)"""
+        request_id = request["request_id"]
+        old = self.pending_requests.get(request_id)
+        self.pending_requests = {**self.pending_requests, request_id: request}
+        
+        index = dict(self._pending_by_to_ip)
+        still_indexed = request["status"] == "pending" and old is not None and old["to_ip"] == request["to_ip"]
+        if not still_indexed and old is not None and request_id in index.get(old["to_ip"], {}):
+            bucket = dict(index[old["to_ip"]])
+            del bucket[request_id]
+            if bucket:
+                index[old["to_ip"]] = bucket
+            else:
+                del index[old["to_ip"]]
+        if request["status"] == "pending":
+            index[request["to_ip"]] = {**index.get(request["to_ip"], {}), request_id: request}
+        self._pending_by_to_ip = index
+        self.pending_version += 1
     
     def request_connection(self, from_ip: str, from_name: str, to_ip: str, to_name: str) -> str:
         """
@@ -25,21 +123,52 @@ class ConnectionManager:
         Returns:
             request_id: Unique ID for this request
         """
-        with self.lock:
-            self.request_counter += 1
-            request_id = f"req_{self.request_counter}_{datetime.now().timestamp()}"
-            
-            self.pending_requests[request_id] = {
-                "request_id": request_id,
-                "from_ip": from_ip,
-                "from_name": from_name,
-                "to_ip": to_ip,
-                "to_name": to_name,
-                "status": "pending",
-                "created_at": datetime.now().isoformat()
-            }
-            
-            return request_id
+        now = time.time()
+        request_id = self._request_id_prefix + str(next(self._request_counter))
+        request = {
+            "request_id": request_id,
+            "from_ip": from_ip,
+            "from_name": from_name,
+            "to_ip": to_ip,
+            "to_name": to_name,
+            "status": "pending",
+            "created_at": now
+        }
+        
+        with self.pending_lock:
+            self._store_pending(request)
+        
+        return request_id
+    
+    def upsert_pending(self, request: Dict):
+        """Store a connection request received from another device
+        
+        The entry is built by the caller, so the lock only covers the swap.
+        """
+        with self.pending_lock:
+            self._store_pending(request)
+    
+    def prune_finished_requests(self) -> int:
+        """Drop accepted/rejected requests older than FINISHED_REQUEST_TTL
+        
+        Returns:
+            Number of requests removed
+        """
+        cutoff = time.time() - self.FINISHED_REQUEST_TTL
+        with self.pending_lock:
+            expired = [
+                request_id for request_id, request in self.pending_requests.items()
+                if request["status"] != "pending"
+                and (request.get("accepted_at") or request.get("rejected_at") or cutoff) < cutoff
+            ]
+            if expired:
+                # Finished requests are never in the to_ip index, so only the map changes
+                requests = dict(self.pending_requests)
+                for request_id in expired:
+                    del requests[request_id]
+                self.pending_requests = requests
+                self.pending_version += 1
+        return len(expired)
     
     def accept_connection(self, request_id: str, from_ip: str, to_ip: str) -> bool:
         """Accept a connection request
@@ -49,83 +178,115 @@ class ConnectionManager:
             from_ip: IP of the device that requested the connection (the peer)
             to_ip: IP of this device (local IP - should NOT be stored)
         """
-        with self.lock:
-            if request_id not in self.pending_requests:
-                return False
-            
-            request = self.pending_requests[request_id]
-            if request["status"] != "pending":
+        # Cheap lock-free rejection of unknown or already-answered requests
+        request = self.pending_requests.get(request_id)
+        if request is None or request["status"] != "pending":
+            return False
+        
+        now = time.time()
+        with self.pending_lock, self.connections_lock:
+            # Re-read under the lock: the entry may have been replaced meanwhile
+            # (mark_delivered, a peer re-sending it) and must still be pending
+            request = self.pending_requests.get(request_id)
+            if request is None or request["status"] != "pending":
                 return False
-            
-            # Update request status
-            request["status"] = "accepted"
-            request["accepted_at"] = datetime.now().isoformat()
-            
+            accepted_request = {**request, "status": "accepted", "accepted_at": now}
             # Only store the peer's connection (from_ip), not our own IP (to_ip)
             # Each device should only track connections TO other devices, not to itself
-            self.connections[from_ip] = {
+            connection = {
                 "peer_ip": from_ip,
                 "peer_name": request["from_name"],
-                "connected_at": datetime.now().isoformat(),
+                "connected_at": now,
                 "status": "connected"
             }
-            
-            return True
+            self._store_pending(accepted_request)
+            self.connections = {**self.connections, from_ip: connection}
+            self.connections_version += 1
+        
+        return True
     
     def reject_connection(self, request_id: str) -> bool:
         """Reject a connection request"""
-        with self.lock:
-            if request_id not in self.pending_requests:
+        with self.pending_lock:
+            request = self.pending_requests.get(request_id)
+            if request is None:
                 return False
             
-            self.pending_requests[request_id]["status"] = "rejected"
-            self.pending_requests[request_id]["rejected_at"] = datetime.now().isoformat()
+            self._store_pending({**request, "status": "rejected", "rejected_at": time.time()})
             return True
     
+    def mark_delivered(self, request_id: str, delivered: bool):
+        """Record whether the peer notification for a request got through"""
+        with self.pending_lock:
+            request = self.pending_requests.get(request_id)
+            if request is None:
+                return
+            self._store_pending({**request, "delivered": delivered})
+    
+    def upsert_connection(self, connection: Dict):
+        """Store a connection that was accepted on the peer's side
+        
+        The entry is built by the caller, so the lock only covers the swap.
+        """
+        with self.connections_lock:
+            self.connections = {**self.connections, connection["peer_ip"]: connection}
+            self.connections_version += 1
+    
     def disconnect(self, peer_ip: str):
         """Disconnect from a peer"""
-        with self.lock:
+        with self.connections_lock:
             if peer_ip in self.connections:
-                del self.connections[peer_ip]
+                connections = dict(self.connections)
+                del connections[peer_ip]
+                self.connections = connections
+                self.connections_version += 1
     
     def is_connected(self, peer_ip: str) -> bool:
-        """Check if connected to a peer"""
-        with self.lock:
-            return peer_ip in self.connections and self.connections[peer_ip]["status"] == "connected"
+        """Check if connected to a peer (lock-free read of the current snapshot)"""
+        info = self.connections.get(peer_ip)
+        return info is not None and info["status"] == "connected"
     
     def get_connections(self, exclude_ip: str = None) -> list:
-        """Get list of all connected peers
+        """Get list of all connected peers (lock-free read of the current snapshot)
         
         Args:
             exclude_ip: Optional IP address to exclude from results (e.g., local IP)
         """
-        with self.lock:
-            return [
-                {
-                    "peer_ip": info["peer_ip"],
-                    "peer_name": info["peer_name"],
-                    "connected_at": info["connected_at"]
-                }
-                for ip, info in self.connections.items()
-                if info["status"] == "connected" and (exclude_ip is None or info["peer_ip"] != exclude_ip)
-            ]
+        return [
+            {
+                "peer_ip": info["peer_ip"],
+                "peer_name": info["peer_name"],
+                "connected_at": format_timestamp(info["connected_at"])
+            }
+            for ip, info in self.connections.items()
+            if info["status"] == "connected" and (exclude_ip is None or info["peer_ip"] != exclude_ip)
+        ]
     
     def get_pending_requests_for(self, ip: str) -> list:
-        """Get pending requests for a specific IP"""
-        with self.lock:
+        """Get pending requests for a specific IP (lock-free read of the to_ip index)"""
+        pending = [
+            {**request, "created_at": format_timestamp(request["created_at"])}
+            for request in self._pending_by_to_ip.get(ip, {}).values()
+        ]
+        if logger.isEnabledFor(logging.DEBUG):
             all_requests = list(self.pending_requests.values())
-            pending = [
-                request
-                for request in all_requests
-                if request["to_ip"] == ip and request["status"] == "pending"
-            ]
             logger.debug(f"get_pending_requests_for({ip}): Found {len(pending)} pending out of {len(all_requests)} total requests")
             if len(all_requests) > 0:
                 logger.debug(f"  All requests: {[(r['request_id'], r['to_ip'], r['status']) for r in all_requests]}")
-            return pending
+        return pending
     
     def get_request(self, request_id: str) -> Optional[Dict]:
-        """Get a specific request"""
-        with self.lock:
-            return self.pending_requests.get(request_id)
-
+        """Get a specific request (lock-free read of the current snapshot)"""
+        return self.pending_requests.get(request_id)
+    
+    def snapshot(self) -> Tuple[List[Dict], List[Dict]]:
+        """Get (connections, pending_requests) in one pass, with formatted timestamps
+        
+        Both are read from the current copy-on-write snapshots without locking.
+        """
+        connections = list(self.connections.values())
+        requests = list(self.pending_requests.values())
+        return (
+            [_with_formatted_timestamps(info) for info in connections],
+            [_with_formatted_timestamps(request) for request in requests],
+        )
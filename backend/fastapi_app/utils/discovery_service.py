@@ -1,221 +1,297 @@
 """
 Device discovery service that manages UDP broadcast and listening
 """
-import json
+import asyncio
+import os
 import socket
+import struct
 import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from collections import OrderedDict
 
+import orjson
+
 from utils.network_utils import (
     get_local_ip,
     get_device_name,
     create_broadcast_socket,
     create_listener_socket,
-    get_broadcast_address
+    get_broadcast_address,
+    DISCOVERY_MULTICAST_GROUP
 )
 from utils.logger import get_logger
 
 logger = get_logger("discovery")
 
 
+# Binary announcement: version, flags, IPv4 address, name length, then the
+# UTF-8 device name. A JSON announcement always starts with b"{", so the
+# first byte tells the two formats apart.
+ANNOUNCE_VERSION = 1
+_ANNOUNCE_HEADER = struct.Struct("!BB4sB")
+
+
+def encode_announcement(device_name: str, ip: str, binary: bool) -> bytes:
+    """Encode this device's announcement in the binary or legacy JSON format"""
+    if not binary:
+        return orjson.dumps({"device_name": device_name, "ip": ip})
+    name = device_name.encode("utf-8")[:255]
+    return _ANNOUNCE_HEADER.pack(ANNOUNCE_VERSION, 0, socket.inet_aton(ip), len(name)) + name
+
+
+def decode_announcement(data: bytes) -> Optional[Dict]:
+    """Decode a binary or JSON announcement into {"device_name", "ip"}, or None if invalid"""
+    if data[:1] == bytes([ANNOUNCE_VERSION]):
+        if len(data) < _ANNOUNCE_HEADER.size:
+            return None
+        _, _, ip_bytes, name_len = _ANNOUNCE_HEADER.unpack_from(data)
+        name = data[_ANNOUNCE_HEADER.size:_ANNOUNCE_HEADER.size + name_len]
+        # errors="ignore" drops a multi-byte character cut off by the 255-byte limit
+        return {"device_name": name.decode("utf-8", errors="ignore"), "ip": socket.inet_ntoa(ip_bytes)}
+    try:
+        message = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Feeds datagrams received on the discovery port to the service"""
+    
+    def __init__(self, service: "DiscoveryService"):
+        self.service = service
+    
+    def datagram_received(self, data: bytes, addr):
+        self.service._handle_datagram(data, addr)
+
+
 class DiscoveryService:
     """Service for discovering and managing peer devices on LAN"""
 
     BROADCAST_PORT = 8888
     BROADCAST_INTERVAL = 3.0  # seconds - broadcast presence every 3 seconds
     PEER_TIMEOUT = 15.0  # seconds - peer considered inactive if no message for this duration (5x broadcast interval)
+    PEERS_FLUSH_INTERVAL = 1.0  # seconds - peers.json is rewritten at most this often
+    MAX_PEERS = 256  # least recently seen peers are evicted beyond this (bounds memory under floods)
+    # Every peer decodes binary announcements, but older releases only read JSON;
+    # flip this once they are no longer in use
+    ANNOUNCE_BINARY = False
+    # Every peer joins the multicast group, but older releases only listen for
+    # broadcasts; flip this once they are no longer in use
+    ANNOUNCE_MULTICAST = False
     
     def __init__(self, logs_dir: str = "logs"):
         self.device_name = get_device_name()
         self.local_ip = get_local_ip()
         self.peers: OrderedDict[str, Dict] = OrderedDict()
+        # Still a threading lock: _log_peers() reads the peers from an executor thread
         self.peers_lock = threading.Lock()
+        self._name_to_ip: Dict[str, str] = {}  # device_name -> current peer IP (guarded by peers_lock)
+        # Bumped under peers_lock on every change; get_peers() rebuilds its
+        # (version, list) snapshot only when they differ
+        self._peers_version = 0
+        self._peers_snapshot: Tuple[int, List[Dict]] = (0, [])
         self.running = False
         self.logs_dir = Path(logs_dir)
         self.logs_dir.mkdir(exist_ok=True)
         self.peers_file = self.logs_dir / "peers.json"
+        self._peers_dirty = False  # peers changed since peers.json was last written
         
-        # Background threads
-        self.broadcast_thread: Optional[threading.Thread] = None
-        self.listener_thread: Optional[threading.Thread] = None
+        # Event loop resources, created by start()
+        self._listener_transport: Optional[asyncio.DatagramTransport] = None
+        self._broadcast_transport: Optional[asyncio.DatagramTransport] = None
+        self._tasks: List[asyncio.Task] = []
         
-    def start(self):
-        """Start the discovery service (broadcast and listener threads)"""
+    async def start(self):
+        """Start the discovery service (broadcast, listener and cleanup on the running event loop)"""
         if self.running:
             return
         
         self.running = True
+        loop = asyncio.get_running_loop()
         
-        # Start broadcast thread
-        self.broadcast_thread = threading.Thread(
-            target=self._broadcast_loop,
-            daemon=True,
-            name="DiscoveryBroadcast"
+        # Listener: datagrams are dispatched by the event loop, no thread per socket
+        self._listener_transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DiscoveryProtocol(self),
+            sock=create_listener_socket(self.BROADCAST_PORT, DISCOVERY_MULTICAST_GROUP)
         )
-        self.broadcast_thread.start()
+        logger.info(f"Discovery listener started on port {self.BROADCAST_PORT}")
+        logger.info(f"Listening for broadcasts from other devices...")
         
-        # Start listener thread
-        self.listener_thread = threading.Thread(
-            target=self._listener_loop,
-            daemon=True,
-            name="DiscoveryListener"
+        self._broadcast_transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol,
+            sock=create_broadcast_socket(self.BROADCAST_PORT)
         )
-        self.listener_thread.start()
         
-        # Start cleanup thread for expired peers
-        cleanup_thread = threading.Thread(
-            target=self._cleanup_loop,
-            daemon=True,
-            name="DiscoveryCleanup"
-        )
-        cleanup_thread.start()
+        self._tasks = [
+            asyncio.create_task(self._broadcast_loop()),
+            asyncio.create_task(self._cleanup_loop()),
+            asyncio.create_task(self._flush_peers_loop())
+        ]
     
     def stop(self):
         """Stop the discovery service"""
         self.running = False
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._peers_dirty:
+            self._peers_dirty = False
+            self._log_peers()
+        for transport in (self._listener_transport, self._broadcast_transport):
+            if transport is not None:
+                transport.close()
+        self._listener_transport = None
+        self._broadcast_transport = None
     
-    def _broadcast_loop(self):
-        """Continuously broadcast device information every 2 seconds"""
-        sock = None
-        # Use network-wide broadcast to reach all subnets
-        # For college/public WiFi, this is needed when devices are on different subnets
-        broadcast_addrs = ['255.255.255.255', get_broadcast_address()]
+    async def _broadcast_loop(self):
+        """Broadcast device information every BROADCAST_INTERVAL seconds"""
+        if self.ANNOUNCE_MULTICAST:
+            broadcast_addrs = [DISCOVERY_MULTICAST_GROUP]
+        else:
+            # Use network-wide broadcast to reach all subnets
+            # For college/public WiFi, this is needed when devices are on different subnets
+            broadcast_addrs = ['255.255.255.255', get_broadcast_address()]
+        
+        # The announcement only changes with the local IP, so it is encoded once per IP
+        payload_ip = None
+        data = b""
         
         try:
-            sock = create_broadcast_socket(self.BROADCAST_PORT)
-            
             while self.running:
                 # Refresh local IP on each broadcast to handle network changes
-                current_local_ip = get_local_ip()
-                if self.local_ip != current_local_ip:
-                    logger.info(f"🔄 Local IP changed from {self.local_ip} to {current_local_ip}")
-                    self.local_ip = current_local_ip
-                
-                message = {
-                    "device_name": self.device_name,
-                    "ip": self.local_ip
-                }
+                self._refresh_local_ip()
                 
-                data = json.dumps(message).encode('utf-8')
+                if self.local_ip != payload_ip:
+                    payload_ip = self.local_ip
+                    data = encode_announcement(self.device_name, payload_ip, self.ANNOUNCE_BINARY)
                 
-                # Try broadcasting to both network-wide and subnet-specific addresses
+                # Try broadcasting to both network-wide and subnet-specific addresses;
+                # send errors are reported to the protocol, so one failing address
+                # (e.g. blocked network-wide broadcast) doesn't stop the other
                 for broadcast_addr in broadcast_addrs:
-                    try:
-                        sock.sendto(data, (broadcast_addr, self.BROADCAST_PORT))
-                    except Exception as e:
-                        # If subnet broadcast fails, continue with next address
-                        if broadcast_addr == '255.255.255.255':
-                            # Log if network-wide broadcast fails (might be blocked)
-                            pass
-                        continue
+                    self._broadcast_transport.sendto(data, (broadcast_addr, self.BROADCAST_PORT))
                 
-                time.sleep(self.BROADCAST_INTERVAL)
+                await asyncio.sleep(self.BROADCAST_INTERVAL)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Broadcast error: {e}", exc_info=True)
-        finally:
-            if sock:
-                sock.close()
     
-    def _listener_loop(self):
-        """Continuously listen for broadcast messages from other devices"""
-        sock = create_listener_socket(self.BROADCAST_PORT)
-        sock.settimeout(1.0)  # Non-blocking with timeout
-        
-        logger.info(f"Discovery listener started on port {self.BROADCAST_PORT}")
-        logger.info(f"Listening for broadcasts from other devices...")
-        
+    def _refresh_local_ip(self):
+        """Pick up local IP changes (get_local_ip() is TTL-cached, so this is cheap)"""
+        current_local_ip = get_local_ip()
+        if self.local_ip != current_local_ip:
+            logger.info(f"🔄 Local IP changed from {self.local_ip} to {current_local_ip}")
+            self.local_ip = current_local_ip
+    
+    def _handle_datagram(self, data: bytes, addr: Tuple[str, int]):
+        """Handle one broadcast message from another device (runs on the event loop)"""
         try:
-            while self.running:
-                try:
-                    data, addr = sock.recvfrom(1024)
-                    message = json.loads(data.decode('utf-8'))
-                    
-                    # Refresh local IP to handle network changes
-                    current_local_ip = get_local_ip()
-                    if self.local_ip != current_local_ip:
-                        logger.info(f"🔄 Local IP changed from {self.local_ip} to {current_local_ip}")
-                        self.local_ip = current_local_ip
-                    
-                    # Ignore messages from ourselves
-                    if message.get("ip") == self.local_ip:
-                        continue
-                    
-                    # Update peer information
-                    peer_ip = message.get("ip")
-                    if peer_ip:
-                        logger.info(f"✓ Received broadcast from {peer_ip} ({message.get('device_name', 'Unknown')})")
-                        self._update_peer(peer_ip, message)
-                        
-                except socket.timeout:
-                    # Timeout is expected, continue listening
-                    continue
-                except json.JSONDecodeError:
-                    # Invalid JSON, skip
-                    continue
-                except Exception as e:
-                    logger.error(f"Listener error: {e}", exc_info=True)
-                    continue
-        finally:
-            sock.close()
+            # Our own broadcasts loop back to the listener: drop them by source
+            # address before decoding
+            self._refresh_local_ip()
+            if addr[0] == self.local_ip:
+                return
+            
+            message = decode_announcement(data)
+            if message is None:
+                # Malformed announcement, skip
+                return
+            
+            # Ignore messages announcing our own IP (e.g. relayed from another interface)
+            if message.get("ip") == self.local_ip:
+                return
+            
+            # Update peer information
+            peer_ip = message.get("ip")
+            if peer_ip:
+                logger.info(f"✓ Received broadcast from {peer_ip} ({message.get('device_name', 'Unknown')})")
+                self._update_peer(peer_ip, message)
+        except Exception as e:
+            logger.error(f"Listener error: {e}", exc_info=True)
     
     def _update_peer(self, ip: str, peer_info: Dict):
         """Update peer information and log to file"""
+        # Timestamps are taken before the lock so it only covers the dict updates
+        last_seen = datetime.now().isoformat()
+        last_seen_mono = time.monotonic()
         with self.peers_lock:
             device_name = peer_info.get("device_name", "Unknown")
             
-            # Check if we already have this device with a different IP
-            # If so, remove the old entry to prevent stale IPs
-            old_ip_to_remove = None
-            for existing_ip, existing_info in list(self.peers.items()):
-                if existing_info.get("device_name") == device_name and existing_ip != ip:
-                    old_ip_to_remove = existing_ip
-                    logger.info(f"🔄 Device {device_name} IP changed from {existing_ip} to {ip}")
-                    break
+            # If we already have this device under a different IP, remove the
+            # old entry to prevent stale IPs
+            old_ip = self._name_to_ip.get(device_name)
+            if old_ip is not None and old_ip != ip and old_ip in self.peers:
+                logger.info(f"🔄 Device {device_name} IP changed from {old_ip} to {ip}")
+                del self.peers[old_ip]
             
-            # Remove old IP entry if device name matches but IP changed
-            if old_ip_to_remove:
-                del self.peers[old_ip_to_remove]
+            # An IP that was announced under another name no longer owns that name
+            previous = self.peers.get(ip)
+            if previous is not None:
+                previous_name = previous.get("device_name", "Unknown")
+                if previous_name != device_name and self._name_to_ip.get(previous_name) == ip:
+                    del self._name_to_ip[previous_name]
+            self._name_to_ip[device_name] = ip
             
-            # Update/add peer with current IP
+            # Update/add peer with current IP. The ISO string is for the API and
+            # the peers file; expiry compares the monotonic timestamp instead
             self.peers[ip] = {
                 **peer_info,
-                "last_seen": datetime.now().isoformat()
+                "last_seen": last_seen,
+                "_last_seen_mono": last_seen_mono
             }
+            # Keep peers ordered least -> most recently seen, evicting from the front
+            self.peers.move_to_end(ip)
+            while len(self.peers) > self.MAX_PEERS:
+                evicted_ip, evicted = self.peers.popitem(last=False)
+                evicted_name = evicted.get("device_name", "Unknown")
+                if self._name_to_ip.get(evicted_name) == evicted_ip:
+                    del self._name_to_ip[evicted_name]
+            self._peers_version += 1
         
-        # Write to JSON file
-        self._log_peers()
+        # Written to the JSON file by the flush loop
+        self._peers_dirty = True
     
-    def _cleanup_loop(self):
+    async def _cleanup_loop(self):
         """Periodically remove expired peers"""
         while self.running:
-            time.sleep(self.BROADCAST_INTERVAL)
+            await asyncio.sleep(self.BROADCAST_INTERVAL)
             
-            current_time = datetime.now()
-            expired_peers = []
+            cutoff = time.monotonic() - self.PEER_TIMEOUT
             
             with self.peers_lock:
-                for ip, peer_info in list(self.peers.items()):
-                    last_seen_str = peer_info.get("last_seen")
-                    if last_seen_str:
-                        try:
-                            last_seen = datetime.fromisoformat(last_seen_str)
-                            elapsed = (current_time - last_seen).total_seconds()
-                            
-                            if elapsed > self.PEER_TIMEOUT:
-                                expired_peers.append(ip)
-                        except Exception:
-                            # If parsing fails, mark as expired
-                            expired_peers.append(ip)
+                expired_peers = [
+                    ip for ip, peer_info in self.peers.items()
+                    if peer_info["_last_seen_mono"] < cutoff
+                ]
                 
                 for ip in expired_peers:
-                    del self.peers[ip]
+                    device_name = self.peers.pop(ip).get("device_name", "Unknown")
+                    if self._name_to_ip.get(device_name) == ip:
+                        del self._name_to_ip[device_name]
+                if expired_peers:
+                    self._peers_version += 1
             
             if expired_peers:
-                self._log_peers()
+                self._peers_dirty = True
+    
+    async def _flush_peers_loop(self):
+        """Write peers.json at most once per PEERS_FLUSH_INTERVAL, and only after a change
+        
+        Every received broadcast updates a peer, so writing on each update would
+        rewrite the file several times per broadcast interval on a busy LAN.
+        """
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(self.PEERS_FLUSH_INTERVAL)
+            if self._peers_dirty:
+                self._peers_dirty = False
+                # Off the event loop: it's a file write
+                await loop.run_in_executor(None, self._log_peers)
     
     def _log_peers(self):
         """Write current peers list to JSON file"""
@@ -230,18 +306,31 @@ class DiscoveryService:
                     for ip, peer_info in self.peers.items()
                 ]
             
-            with open(self.peers_file, 'w') as f:
-                json.dump({
+            # Write a temp file and rename it over peers.json, so readers never
+            # see a half-written file
+            tmp_file = self.peers_file.with_suffix(".tmp")
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps({
                     "updated_at": datetime.now().isoformat(),
                     "peers": peers_list
-                }, f, indent=2)
+                }, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, self.peers_file)
         except Exception as e:
             logger.error(f"Error logging peers: {e}", exc_info=True)
     
     def get_peers(self) -> List[Dict]:
-        """Get current list of active peers"""
+        """Get current list of active peers
+        
+        Returns a shared snapshot without locking while the peers are unchanged;
+        callers must not modify it.
+        """
+        version, peers = self._peers_snapshot
+        if version == self._peers_version:
+            return peers
+        
         with self.peers_lock:
-            return [
+            version = self._peers_version
+            peers = [
                 {
                     "ip": ip,
                     "device_name": peer_info.get("device_name", "Unknown"),
@@ -249,4 +338,13 @@ class DiscoveryService:
                 }
                 for ip, peer_info in self.peers.items()
             ]
+        self._peers_snapshot = (version, peers)
+        return peers
+    
+    def get_peer(self, ip: str) -> Optional[Dict]:
+        """Get a single active peer by IP (O(1) lookup in the IP-keyed peers dict)
 
+        Peer entries are replaced, never mutated in place, so the returned
+        dict can be used without holding the lock.
+        """
+        return self.peers.get(ip)
@@ -1,23 +1,59 @@
 """
 File handling utilities for file transfer operations
 """
+import asyncio
+import atexit
+import errno
+import logging
 import socket
 import os
 import sys
-import json
+import queue
+import select
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Tuple, Callable
+from typing import Callable, Dict, List, Optional, Tuple
 
+import orjson
+
+from utils.logger import get_logger
+
+try:
+    import fcntl  # Unix only; used to enlarge the splice pipe
+except ImportError:
+    fcntl = None
+
+
+logger = get_logger("file_handler")
 
 TRANSFER_PORT = 9000
-CHUNK_SIZE = 64 * 1024  # 64KB - increased for better performance  
 OPTIMAL_CHUNK_SIZE = 1024 * 1024  # 1MB - larger chunks for maximum throughput on fast networks
-STREAMING_BUFFER_SIZE = 16 * 1024 * 1024  # 16MB buffer for better TCP performance
-LARGE_FILE_THRESHOLD = 100 * 1024 * 1024  # 100MB - threshold for chunked streaming
+STREAMING_BUFFER_SIZE = 16 * 1024 * 1024  # 16MB - socket buffer size for _optimize_tcp_socket(force_buffer=...) when autotuning is unavailable
+METADATA_MAX_SIZE = 64 * 1024  # Upper bound on the JSON header (\u-escaped non-ASCII names from older senders can exceed 1KB)
 PROGRESS_UPDATE_INTERVAL = 1 * 1024 * 1024  # Update progress every 1MB for better UI responsiveness
 
 
+# Idle receive buffers (OPTIMAL_CHUNK_SIZE bytearrays) shared by concurrent
+# receive_file calls; at most RECV_BUFFER_POOL_SIZE are kept for reuse
+RECV_BUFFER_POOL_SIZE = 4
+_recv_buffer_pool = queue.SimpleQueue()
+
+
+def _acquire_recv_buffer() -> bytearray:
+    """Take a receive buffer from the pool, allocating one if none is idle"""
+    try:
+        return _recv_buffer_pool.get_nowait()
+    except queue.Empty:
+        return bytearray(OPTIMAL_CHUNK_SIZE)
+
+
+def _release_recv_buffer(buf: bytearray):
+    """Return a receive buffer to the pool (dropped if the pool is full)"""
+    if _recv_buffer_pool.qsize() < RECV_BUFFER_POOL_SIZE:
+        _recv_buffer_pool.put(buf)
+
+
 def get_downloads_folder() -> Path:
     """
     Get the user's Downloads folder path (cross-platform)
@@ -36,6 +72,116 @@ def get_downloads_folder() -> Path:
     return downloads
 
 
+def _splice_to_file(sock: socket.socket, f, total_received: int, file_size: int, progress_callback: Optional[Callable[[int], None]], progress_interval: int) -> Optional[int]:
+    """
+    Move socket data into the file with splice(2) (Linux only), through a pipe
+    
+    The bytes stay in kernel space: socket -> pipe -> file, with no Python
+    bytes object per chunk. Progress is tracked from the returned byte counts.
+    
+    Args:
+        sock: Connected socket, positioned after the metadata/ack handshake
+        f: File opened for binary writing (nothing buffered yet)
+        total_received: Bytes already written to f
+        file_size: Expected total size
+        progress_callback: Called periodically with the bytes received so far
+        progress_interval: Minimum bytes between progress callbacks
+    
+    Returns:
+        Bytes received so far (equal to file_size when done, lower if splice is
+        unsupported here and the caller should continue with recv), or None if
+        the connection failed
+    """
+    if not hasattr(os, 'splice'):
+        return total_received
+    
+    # A socket with a timeout is non-blocking at the fd level, so wait for
+    # readability ourselves and honour the same timeout
+    timeout = sock.gettimeout()
+    poller = select.poll()
+    poller.register(sock.fileno(), select.POLLIN)
+    poll_timeout = None if timeout is None else int(timeout * 1000)
+    
+    read_fd, write_fd = os.pipe()
+    try:
+        if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+            try:
+                fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, OPTIMAL_CHUNK_SIZE)
+            except OSError:
+                pass  # Keep the default pipe size (64KB) if the limit is lower
+        
+        last_progress_update = total_received
+        next_progress_update = total_received + progress_interval
+        while total_received < file_size:
+            _set_quickack(sock)
+            try:
+                moved = os.splice(sock.fileno(), write_fd, min(OPTIMAL_CHUNK_SIZE, file_size - total_received), flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            except BlockingIOError:
+                if not poller.poll(poll_timeout):
+                    logger.warning(f"⚠️ Timed out while receiving. Expected {file_size} bytes, received {total_received} bytes")
+                    return None
+                continue
+            except OSError as e:
+                if total_received == 0 and e.errno == errno.EINVAL:
+                    return total_received  # splice unsupported for this socket
+                logger.warning(f"⚠️ Connection error while receiving: {e} (received {total_received} bytes before connection closed)")
+                return None
+            if moved == 0:
+                logger.warning(f"⚠️ Socket closed prematurely. Expected {file_size} bytes, received {total_received} bytes")
+                return None
+            
+            pending = moved
+            while pending:
+                try:
+                    pending -= os.splice(read_fd, f.fileno(), pending, flags=os.SPLICE_F_MOVE)
+                except OSError as e:
+                    if e.errno != errno.EINVAL:
+                        raise
+                    # Filesystem doesn't accept splice writes: drain the pipe
+                    # and let the caller finish with the recv loop
+                    while pending:
+                        data = os.read(read_fd, pending)
+                        f.write(data)
+                        pending -= len(data)
+                    return total_received + moved
+            total_received += moved
+            
+            if progress_callback and total_received >= next_progress_update:
+                progress_callback(total_received)
+                last_progress_update = total_received
+                next_progress_update = total_received + progress_interval
+        return total_received
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def _recv_metadata(sock: socket.socket) -> Optional[Dict]:
+    """
+    Receive the JSON metadata header that starts every transfer
+    
+    The sender waits for our ack before sending file data, so everything
+    that arrives before it is metadata; keep reading until it parses, in
+    case the header was split across segments.
+    
+    Returns:
+        Parsed metadata, or None if the connection closed or the header
+        didn't parse within METADATA_MAX_SIZE bytes
+    """
+    data = b""
+    while len(data) < METADATA_MAX_SIZE:
+        chunk = sock.recv(METADATA_MAX_SIZE - len(data))
+        if not chunk:
+            return None
+        data += chunk
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            continue  # Incomplete so far
+    logger.warning(f"⚠️ Transfer metadata exceeded {METADATA_MAX_SIZE} bytes")
+    return None
+
+
 def receive_file(sock: socket.socket, save_dir: str = None, progress_callback: Optional[Callable[[int], None]] = None, metadata_callback: Optional[Callable[[str, int], None]] = None) -> Tuple[Optional[str], Optional[int]]:
     """
     Receive a file from a TCP socket connection
@@ -55,14 +201,17 @@ def receive_file(sock: socket.socket, save_dir: str = None, progress_callback: O
     
     save_path.mkdir(exist_ok=True)
     
+    buf = view = None
+    file_path = None
+    total_received = 0
+    preallocated = complete = False
     try:
         # First, receive file metadata (filename and size)
         # Format: "filename|size" (JSON encoded)
-        metadata_json = sock.recv(1024).decode('utf-8')
-        if not metadata_json:
+        metadata = _recv_metadata(sock)
+        if metadata is None:
             return None, None
         
-        metadata = json.loads(metadata_json)
         filename = metadata.get('filename')
         file_size = metadata.get('size', 0)
         
@@ -75,12 +224,20 @@ def receive_file(sock: socket.socket, save_dir: str = None, progress_callback: O
         
         # Send acknowledgment that we received metadata
         sock.send(b'OK')
+        _set_quickack(sock)
         
         # Save file
         file_path = save_path / filename
         total_received = 0
         
+        # Received chunks land in a pooled buffer rather than a fresh bytes
+        # object per recv()
+        buf = _acquire_recv_buffer()
+        view = memoryview(buf)
         with open(file_path, 'wb') as f:
+            if file_size > 0:
+                preallocated = _preallocate(f, file_size)
+            
             # Handle unknown file size (file_size = 0)
             # Determine progress update frequency based on file size
             # For small files (<10MB), update more frequently for better UI feedback
@@ -89,75 +246,99 @@ def receive_file(sock: socket.socket, save_dir: str = None, progress_callback: O
             if file_size == 0:
                 # Stream until connection closes
                 last_progress_update = 0
+                next_progress_update = progress_interval
                 while True:
+                    _set_quickack(sock)
                     try:
-                        chunk = sock.recv(OPTIMAL_CHUNK_SIZE)  # Use larger chunks
-                        if not chunk:
+                        n = sock.recv_into(view, OPTIMAL_CHUNK_SIZE)
+                        if not n:
                             break
                     except (ConnectionResetError, OSError) as e:
                         # Connection was reset or closed (likely cancelled)
-                        print(f"⚠️ Connection error while receiving: {e}")
-                        print(f"   Received {total_received} bytes before connection closed")
+                        logger.warning(f"⚠️ Connection error while receiving: {e} (received {total_received} bytes before connection closed)")
                         return None, None
-                    f.write(chunk)
-                    total_received += len(chunk)
+                    f.write(view[:n])
+                    total_received += n
                     # Call progress callback periodically
-                    if progress_callback and (total_received - last_progress_update) >= progress_interval:
+                    if progress_callback and total_received >= next_progress_update:
                         progress_callback(total_received)
                         last_progress_update = total_received
+                        next_progress_update = total_received + progress_interval
 
                 # Final progress update
                 if progress_callback and total_received > last_progress_update:
                     progress_callback(total_received)
             else:
-                # Known file size: read until we have all bytes
-                # Use larger chunks for better performance
+                # Known file size: splice straight into the file where the
+                # kernel supports it, then recv whatever is left (everything,
+                # on platforms without splice)
+                total_received = _splice_to_file(sock, f, 0, file_size, progress_callback, progress_interval)
+                if total_received is None:
+                    return None, None
                 last_progress_update = 0
+                next_progress_update = total_received + progress_interval
                 while total_received < file_size:
                     remaining = file_size - total_received
                     chunk_size = min(OPTIMAL_CHUNK_SIZE, remaining)
+                    _set_quickack(sock)
                     try:
-                        chunk = sock.recv(chunk_size)
-                        if not chunk:
+                        n = sock.recv_into(view, chunk_size)
+                        if not n:
                             # Socket closed by sender (likely cancelled)
-                            print(f"⚠️ Socket closed prematurely. Expected {file_size} bytes, received {total_received} bytes")
+                            logger.warning(f"⚠️ Socket closed prematurely. Expected {file_size} bytes, received {total_received} bytes")
                             return None, None
                     except (ConnectionResetError, OSError) as e:
                         # Connection was reset or closed (likely cancelled)
-                        print(f"⚠️ Connection error while receiving: {e}")
-                        print(f"   Received {total_received} bytes before connection closed")
+                        logger.warning(f"⚠️ Connection error while receiving: {e} (received {total_received} bytes before connection closed)")
                         return None, None
-                    f.write(chunk)
-                    total_received += len(chunk)
+                    f.write(view[:n])
+                    total_received += n
                     # Call progress callback periodically
-                    if progress_callback and (total_received - last_progress_update) >= progress_interval:
+                    if progress_callback and total_received >= next_progress_update:
                         progress_callback(total_received)
                         last_progress_update = total_received
+                        next_progress_update = total_received + progress_interval
 
                 # Final progress update
                 if progress_callback and total_received > last_progress_update:
                     progress_callback(total_received)
         
+        complete = True
         return str(file_path), total_received
         
     except Exception as e:
-        print(f"Error receiving file: {e}")
+        logger.error(f"Error receiving file: {e}")
         return None, None
-
-
-def _optimize_tcp_socket(sock: socket.socket):
+    finally:
+        if view is not None:
+            view.release()
+            _release_recv_buffer(buf)
+        if preallocated and not complete:
+            # Don't leave a full-size file behind for a transfer that stopped short
+            try:
+                os.truncate(file_path, total_received or 0)
+            except OSError:
+                pass
+
+
+def _optimize_tcp_socket(sock: socket.socket, force_buffer: Optional[int] = None):
     """
     Optimize TCP socket settings for better performance and throughput
     
+    Send/receive buffer sizes are left to the kernel by default: setting
+    SO_SNDBUF/SO_RCVBUF turns off Linux TCP autotuning (tcp_wmem/tcp_rmem) for
+    the socket, and a fixed size is usually worse than letting the window
+    grow with the connection's RTT. On platforms without autotuning (or very
+    old kernels) pass force_buffer, e.g. STREAMING_BUFFER_SIZE, to pin both.
+    
     Args:
         sock: TCP socket to optimize
+        force_buffer: Optional SO_SNDBUF/SO_RCVBUF size in bytes (off by default)
     """
     try:
-        # Increase send buffer to 4MB for better throughput (was 1MB)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, STREAMING_BUFFER_SIZE)
-        
-        # Increase receive buffer on the socket
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, STREAMING_BUFFER_SIZE)
+        if force_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, force_buffer)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, force_buffer)
         
         # Enable TCP_NODELAY for low latency (disable Nagle's algorithm)
         # For large files, we want immediate sending of chunks
@@ -168,32 +349,97 @@ def _optimize_tcp_socket(sock: socket.socket):
         
         # Note: TCP window scaling is negotiated during connection handshake,
         # so we can't set it directly. The kernel handles this automatically.
-        # Large buffers help the kernel use window scaling effectively.
     except Exception as e:
         # If optimization fails, continue with default settings
-        print(f"Warning: Could not optimize socket settings: {e}")
+        logger.warning(f"⚠️ Could not optimize socket settings: {e}")
+
+
+def _set_cork(sock: socket.socket, enabled: bool):
+    """
+    Toggle TCP_CORK (Linux only) around the bulk data phase
+    
+    With TCP_NODELAY on, every send() boundary can push out a short segment;
+    corking holds partial segments back so only full-sized packets go out, and
+    uncorking flushes the tail. The metadata header is sent uncorked because
+    the receiver must get it before replying with the ack.
+    
+    Args:
+        sock: Connected TCP socket
+        enabled: True to cork, False to uncork and flush
+    """
+    if not hasattr(socket, 'TCP_CORK'):
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1 if enabled else 0)
+    except OSError:
+        pass
 
 
-def send_file_from_stream(
+def _set_quickack(sock: socket.socket):
+    """
+    Ask the kernel to ACK immediately instead of delaying (Linux only)
+    
+    Delayed ACKs can hold back the sender's next window by up to 40ms. The
+    kernel drops back to delayed mode on its own after a while, so the
+    receive loops re-arm this on each iteration.
+    
+    Args:
+        sock: Connected TCP socket being received from
+    """
+    if not hasattr(socket, 'TCP_QUICKACK'):
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+    except OSError:
+        pass
+
+
+def _preallocate(f, size: int) -> bool:
+    """
+    Reserve the disk space for a file of known size before writing it
+    
+    Lets the filesystem pick contiguous extents up front instead of growing
+    the file chunk by chunk. The file's size becomes `size` immediately, so
+    a transfer that stops short must truncate it back.
+    
+    Args:
+        f: File object opened for writing
+        size: Final size of the file in bytes
+    
+    Returns:
+        bool: True if the space was reserved
+    """
+    if not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+        return True
+    except OSError:
+        # Unsupported by the filesystem (or no space): plain writes still
+        # work, or fail on their own
+        return False
+
+
+def send_file_from_fileobj(
     target_ip: str,
-    file_stream,
+    file_obj,
     filename: str,
     file_size: int,
     port: int = TRANSFER_PORT,
-    use_optimized: bool = False,
     progress_callback: Optional[Callable[[int], None]] = None,
     socket_store_callback: Optional[Callable[[socket.socket], None]] = None
 ) -> bool:
     """
-    Send file data from a stream/memory buffer to a target IP address via TCP socket
+    Send a file object backed by a real file descriptor (e.g. a spooled upload)
+    using sendfile(2), so the data goes from the page cache to the socket
+    without passing through Python buffers. Blocking; run it in a worker thread.
 
     Args:
         target_ip: IP address of the target device
-        file_stream: File-like object or bytes to send
+        file_obj: Binary file object with a working fileno()
         filename: Name of the file
         file_size: Size of the file in bytes
         port: TCP port to connect to (default: 9000)
-        use_optimized: If True, use 64KB chunks and optimized socket settings
         progress_callback: Optional callback to report bytes sent
         socket_store_callback: Optional callback to store socket for cancellation
 
@@ -201,18 +447,12 @@ def send_file_from_stream(
         bool: True if successful, False otherwise
     """
     sock = None
-    chunk_size = OPTIMAL_CHUNK_SIZE if use_optimized else CHUNK_SIZE
 
     try:
         # Connect to target device
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        timeout = 60 if use_optimized else 30  # Longer timeout for large files
-        sock.settimeout(timeout)
-
-        # Optimize socket for large files
-        if use_optimized:
-            _optimize_tcp_socket(sock)
-
+        sock.settimeout(60)
+        _optimize_tcp_socket(sock)
         sock.connect((target_ip, port))
 
         # Store socket for cancellation support
@@ -224,61 +464,42 @@ def send_file_from_stream(
             'filename': filename,
             'size': file_size
         }
-        metadata_json = json.dumps(metadata).encode('utf-8')
+        metadata_json = orjson.dumps(metadata)
         sock.send(metadata_json)
 
         # Wait for acknowledgment
         ack = sock.recv(2)
         if ack != b'OK':
-            print(f"Did not receive acknowledgment from {target_ip}")
+            logger.warning(f"⚠️ Did not receive acknowledgment from {target_ip}")
             return False
 
-        # Send file data in chunks
+        # sendfile() in progress-sized slices so the UI still sees updates
         total_sent = 0
-        last_progress_update = 0
+        _set_cork(sock, True)
+        while total_sent < file_size:
+            count = min(PROGRESS_UPDATE_INTERVAL, file_size - total_sent)
+            sent = sock.sendfile(file_obj, total_sent, count)
+            if sent == 0:
+                break
+            total_sent += sent
+            if progress_callback:
+                progress_callback(total_sent)
+        _set_cork(sock, False)
 
-        # Handle bytes object (most common case for FastAPI UploadFile.read())
-        if isinstance(file_stream, bytes):
-            while total_sent < file_size:
-                chunk = file_stream[total_sent:total_sent + chunk_size]
-                if not chunk:
-                    break
-                sock.sendall(chunk)
-                total_sent += len(chunk)
-                # Update progress periodically
-                if progress_callback and (total_sent - last_progress_update) >= PROGRESS_UPDATE_INTERVAL:
-                    progress_callback(total_sent)
-                    last_progress_update = total_sent
-        # Handle file-like object with read method
-        elif hasattr(file_stream, 'read'):
-            while total_sent < file_size:
-                chunk = file_stream.read(chunk_size)
-                if not chunk:
-                    break
-                sock.sendall(chunk)
-                total_sent += len(chunk)
-                # Update progress periodically
-                if progress_callback and (total_sent - last_progress_update) >= PROGRESS_UPDATE_INTERVAL:
-                    progress_callback(total_sent)
-                    last_progress_update = total_sent
-        else:
-            print(f"Unsupported file stream type: {type(file_stream)}")
+        if total_sent != file_size:
+            logger.warning(f"⚠️ Sent {total_sent} bytes but expected {file_size} bytes")
             return False
 
-        # Final progress update
-        if progress_callback and total_sent > last_progress_update:
-            progress_callback(total_sent)
-
         return True
 
     except socket.timeout:
-        print(f"Timeout connecting to {target_ip}:{port}")
+        logger.error(f"Timeout connecting to {target_ip}:{port}")
         return False
     except ConnectionRefusedError:
-        print(f"Connection refused by {target_ip}:{port}")
+        logger.error(f"Connection refused by {target_ip}:{port}")
         return False
     except Exception as e:
-        print(f"Error sending file to {target_ip}: {e}")
+        logger.error(f"Error sending file to {target_ip}: {e}")
         return False
     finally:
         if sock:
@@ -318,58 +539,86 @@ async def send_file_chunked_streaming(
         # Optimize socket for large file transfer BEFORE connecting
         _optimize_tcp_socket(sock)
         
-        sock.connect((target_ip, port))
-
         # Store socket for cancellation support
         if socket_store_callback:
             socket_store_callback(sock)
 
-        # Send file metadata
         metadata = {
             'filename': filename,
             'size': file_size
         }
-        metadata_json = json.dumps(metadata).encode('utf-8')
-        sock.send(metadata_json)
-
-        # Wait for acknowledgment
-        ack = sock.recv(2)
+        metadata_json = orjson.dumps(metadata)
+
+        def handshake() -> bytes:
+            sock.connect((target_ip, port))
+            sock.sendall(metadata_json)
+            return sock.recv(2)
+
+        # Connect, send the metadata and wait for the acknowledgment on a worker
+        # thread: the receiver may be slow to answer (or be this process, whose
+        # accept loop runs on this event loop), and the loop must keep serving
+        loop = asyncio.get_running_loop()
+        ack = await loop.run_in_executor(None, handshake)
         if ack != b'OK':
-            print(f"Did not receive acknowledgment from {target_ip}")
+            logger.warning(f"⚠️ Did not receive acknowledgment from {target_ip}")
             return False
 
-        # Stream file in optimized chunks directly from upload
-        # Read and send in 256KB chunks for optimal TCP efficiency and throughput
-        # Send chunks immediately for zero-copy performance
+        # Stream file in optimized chunks directly from upload, two chunks in
+        # flight: while one is sent from a worker thread the next is read, so
+        # neither side waits on the other and the blocking send never stalls
+        # the event loop. Memory stays at ~2 chunks regardless of file size.
         total_sent = 0
         last_progress_update = 0
+        next_progress_update = PROGRESS_UPDATE_INTERVAL
+        next_progress_print = 10 * 1024 * 1024  # Console fallback every 10MB
+        pending_send = None  # Future for the chunk currently being sent
+        pending_size = 0
         
-        # Read chunks from upload and send immediately (no buffering)
-        # This keeps memory usage constant at ~256KB regardless of file size
-        while True:
-            # Read chunk from upload stream
-            chunk = await file_upload.read(OPTIMAL_CHUNK_SIZE)
-            if not chunk:
-                # EOF reached
-                break
-            
-            # Send chunk immediately to TCP socket
-            # Using sendall ensures all data is sent even if it takes multiple syscalls
-            sock.sendall(chunk)
-            total_sent += len(chunk)
-            
-            # Call progress callback periodically (every 5MB) to reduce overhead
-            # This prevents the progress callback from slowing down the transfer
-            if progress_callback and (total_sent - last_progress_update) >= PROGRESS_UPDATE_INTERVAL:
-                progress_callback(total_sent)
-                last_progress_update = total_sent
-            elif file_size > 0 and total_sent % (10 * 1024 * 1024) == 0:  # Every 10MB
-                # Fallback: Progress indicator for very large files (if size known)
-                progress = (total_sent / file_size) * 100
-                print(f"  📊 Progress: {progress:.1f}% ({total_sent / (1024*1024):.2f} MB / {file_size / (1024*1024):.2f} MB)")
-            elif file_size == 0 and total_sent % (10 * 1024 * 1024) == 0:
-                # Size unknown, just show bytes sent
-                print(f"  📊 Progress: {total_sent / (1024*1024):.2f} MB sent...")
+        _set_cork(sock, True)
+        try:
+            while True:
+                # Read the next chunk from the upload stream
+                chunk = await file_upload.read(OPTIMAL_CHUNK_SIZE)
+                
+                # Wait for the previous chunk to finish sending before queueing more
+                if pending_send is not None:
+                    await pending_send
+                    pending_send = None
+                    total_sent += pending_size
+                    
+                    # Call progress callback periodically to reduce overhead
+                    # This prevents the progress callback from slowing down the transfer
+                    if progress_callback and total_sent >= next_progress_update:
+                        progress_callback(total_sent)
+                        last_progress_update = total_sent
+                        next_progress_update = total_sent + PROGRESS_UPDATE_INTERVAL
+                    elif total_sent >= next_progress_print:
+                        next_progress_print = total_sent + 10 * 1024 * 1024
+                        # Only build the message if DEBUG records are kept
+                        if logger.isEnabledFor(logging.DEBUG):
+                            if file_size > 0:
+                                # Fallback: Progress indicator for very large files (if size known)
+                                progress = (total_sent / file_size) * 100
+                                logger.debug(f"📊 Progress: {progress:.1f}% ({total_sent / (1024*1024):.2f} MB / {file_size / (1024*1024):.2f} MB)")
+                            else:
+                                # Size unknown, just show bytes sent
+                                logger.debug(f"📊 Progress: {total_sent / (1024*1024):.2f} MB sent...")
+                
+                if not chunk:
+                    # EOF reached
+                    break
+                
+                # Using sendall ensures all data is sent even if it takes multiple syscalls
+                pending_send = loop.run_in_executor(None, sock.sendall, chunk)
+                pending_size = len(chunk)
+        finally:
+            if pending_send is not None:
+                # Read failed mid-transfer: let the in-flight send settle before
+                # the socket is closed, and don't leave its error unretrieved
+                await asyncio.wait([pending_send])
+                if not pending_send.cancelled():
+                    pending_send.exception()
+        _set_cork(sock, False)
         
         # Final progress update
         if progress_callback and total_sent > last_progress_update:
@@ -378,26 +627,26 @@ async def send_file_chunked_streaming(
         # If file_size was 0 (unknown), we're done - return True
         # If file_size was known, verify we sent everything
         if file_size > 0 and total_sent != file_size:
-            print(f"⚠ Warning: Sent {total_sent} bytes but expected {file_size} bytes")
+            logger.warning(f"⚠️ Sent {total_sent} bytes but expected {file_size} bytes")
             return False
         
         return True
         
     except socket.timeout:
-        print(f"Timeout connecting to {target_ip}:{port}")
+        logger.error(f"Timeout connecting to {target_ip}:{port}")
         return False
     except ConnectionRefusedError:
-        print(f"Connection refused by {target_ip}:{port}")
+        logger.error(f"Connection refused by {target_ip}:{port}")
         return False
     except Exception as e:
-        print(f"Error streaming file to {target_ip}: {e}")
+        logger.error(f"Error streaming file to {target_ip}: {e}")
         return False
     finally:
         if sock:
             sock.close()
 
 
-def send_file(target_ip: str, file_path: str, port: int = TRANSFER_PORT) -> bool:
+def send_file(target_ip: str, file_path: str, port: int = TRANSFER_PORT, progress_callback: Optional[Callable[[int], None]] = None) -> bool:
     """
     Send a file to a target IP address via TCP socket
     
@@ -405,12 +654,13 @@ def send_file(target_ip: str, file_path: str, port: int = TRANSFER_PORT) -> bool
         target_ip: IP address of the target device
         file_path: Path to the file to send
         port: TCP port to connect to (default: 9000)
+        progress_callback: Optional callback called with bytes sent so far
     
     Returns:
         bool: True if successful, False otherwise
     """
     if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
+        logger.error(f"File not found: {file_path}")
         return False
     
     file_path_obj = Path(file_path)
@@ -422,6 +672,7 @@ def send_file(target_ip: str, file_path: str, port: int = TRANSFER_PORT) -> bool
         # Connect to target device
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(30)  # 30 second timeout
+        _optimize_tcp_socket(sock)
         sock.connect((target_ip, port))
         
         # Send file metadata
@@ -429,41 +680,162 @@ def send_file(target_ip: str, file_path: str, port: int = TRANSFER_PORT) -> bool
             'filename': filename,
             'size': file_size
         }
-        metadata_json = json.dumps(metadata).encode('utf-8')
+        metadata_json = orjson.dumps(metadata)
         sock.send(metadata_json)
         
         # Wait for acknowledgment
         ack = sock.recv(2)
         if ack != b'OK':
-            print(f"Did not receive acknowledgment from {target_ip}")
+            logger.warning(f"⚠️ Did not receive acknowledgment from {target_ip}")
             return False
         
-        # Send file in chunks
+        # Send file contents with sendfile(2) so the kernel copies page-cache pages
+        # straight to the socket; socket.sendfile() falls back to a send() loop
+        # on platforms or file types where os.sendfile isn't usable. Sliced so
+        # progress can be reported; an empty file has nothing to send (and
+        # sendfile() rejects a zero count).
+        total_sent = 0
+        _set_cork(sock, True)
         with open(file_path, 'rb') as f:
-            total_sent = 0
             while total_sent < file_size:
-                chunk = f.read(CHUNK_SIZE)
-                if not chunk:
+                count = min(PROGRESS_UPDATE_INTERVAL, file_size - total_sent)
+                sent = sock.sendfile(f, total_sent, count)
+                if sent == 0:
                     break
-                sock.sendall(chunk)
-                total_sent += len(chunk)
+                total_sent += sent
+                if progress_callback:
+                    progress_callback(total_sent)
+        _set_cork(sock, False)
+        
+        if total_sent != file_size:
+            logger.warning(f"⚠️ Sent {total_sent} bytes but expected {file_size} bytes")
+            return False
         
         return True
         
     except socket.timeout:
-        print(f"Timeout connecting to {target_ip}:{port}")
+        logger.error(f"Timeout connecting to {target_ip}:{port}")
         return False
     except ConnectionRefusedError:
-        print(f"Connection refused by {target_ip}:{port}")
+        logger.error(f"Connection refused by {target_ip}:{port}")
         return False
     except Exception as e:
-        print(f"Error sending file to {target_ip}: {e}")
+        logger.error(f"Error sending file to {target_ip}: {e}")
         return False
     finally:
         if sock:
             sock.close()
 
 
+# Transfer history, one JSON object per line so logging a transfer is an
+# append rather than a rewrite of the whole history
+TRANSFER_LOG_FILE = "transfer_logs.ndjson"
+LEGACY_TRANSFER_LOG_FILE = "transfer_logs.json"  # Old single-document format, migrated on first use
+TRANSFER_LOG_BATCH_SIZE = 64  # Max queued entries written per file open
+_transfer_log_lock = threading.Lock()
+_transfer_log_queue = queue.Queue()  # (logs_dir, encoded line) pairs for the writer thread
+_transfer_log_writer: Optional[threading.Thread] = None
+
+
+def _migrate_legacy_transfer_log(log_dir: Path):
+    """
+    Convert an old transfer_logs.json into the NDJSON log (must hold _transfer_log_lock)
+    
+    Only runs while the NDJSON log doesn't exist yet; the old file is kept
+    as transfer_logs.json.bak.
+    """
+    legacy_file = log_dir / LEGACY_TRANSFER_LOG_FILE
+    log_file = log_dir / TRANSFER_LOG_FILE
+    if log_file.exists() or not legacy_file.exists():
+        return
+    
+    try:
+        transfers = orjson.loads(legacy_file.read_bytes()).get('transfers', [])
+    except Exception as e:
+        logger.error(f"Error reading legacy transfer log: {e}")
+        return
+    
+    tmp_file = log_file.with_name(log_file.name + ".tmp")
+    with open(tmp_file, 'wb') as f:
+        for entry in transfers:
+            f.write(orjson.dumps(entry) + b"\n")
+    os.replace(tmp_file, log_file)
+    os.replace(legacy_file, legacy_file.with_name(legacy_file.name + ".bak"))
+
+
+def _write_transfer_log_batch(batch: List[Tuple[str, bytes]]):
+    """Append queued log lines, one file open per logs directory"""
+    lines_by_dir: Dict[str, List[bytes]] = {}
+    for logs_dir, line in batch:
+        lines_by_dir.setdefault(logs_dir, []).append(line)
+    
+    for logs_dir, lines in lines_by_dir.items():
+        log_dir = Path(logs_dir)
+        log_dir.mkdir(exist_ok=True)
+        with _transfer_log_lock:
+            _migrate_legacy_transfer_log(log_dir)
+            with open(log_dir / TRANSFER_LOG_FILE, 'ab') as f:
+                f.writelines(lines)
+
+
+def _transfer_log_worker():
+    """Drain the log queue forever, writing up to TRANSFER_LOG_BATCH_SIZE entries at a time"""
+    while True:
+        batch = [_transfer_log_queue.get()]
+        while len(batch) < TRANSFER_LOG_BATCH_SIZE:
+            try:
+                batch.append(_transfer_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_transfer_log_batch(batch)
+        except Exception as e:
+            logger.error(f"Error writing transfer log: {e}")
+        finally:
+            for _ in batch:
+                _transfer_log_queue.task_done()
+
+
+def _ensure_transfer_log_writer():
+    """Start the log writer thread on first use; pending entries are flushed at exit"""
+    global _transfer_log_writer
+    if _transfer_log_writer is not None:
+        return
+    with _transfer_log_lock:
+        if _transfer_log_writer is None:
+            writer = threading.Thread(target=_transfer_log_worker, name="transfer-log-writer", daemon=True)
+            writer.start()
+            atexit.register(_transfer_log_queue.join)
+            _transfer_log_writer = writer
+
+
+def read_transfer_logs(logs_dir: str = "logs") -> List[Dict]:
+    """
+    Read all logged transfers, oldest first
+    
+    Args:
+        logs_dir: Directory the logs are saved in
+    
+    Returns:
+        List of log entries (lines that fail to parse are skipped)
+    """
+    log_dir = Path(logs_dir)
+    with _transfer_log_lock:
+        _migrate_legacy_transfer_log(log_dir)
+    
+    transfers = []
+    try:
+        with open(log_dir / TRANSFER_LOG_FILE, 'rb') as f:
+            for line in f:
+                try:
+                    transfers.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    continue  # Blank or partially written line
+    except FileNotFoundError:
+        pass
+    return transfers
+
+
 def log_transfer(
     sender_ip: str,
     receiver_ip: str,
@@ -474,7 +846,10 @@ def log_transfer(
     logs_dir: str = "logs"
 ):
     """
-    Log a file transfer to JSON file
+    Append a file transfer to the NDJSON transfer log
+    
+    The entry is queued and written by a background thread (in order), so
+    this returns immediately.
     
     Args:
         sender_ip: IP address of sender
@@ -485,10 +860,6 @@ def log_transfer(
         status: "success" or "failed"
         logs_dir: Directory to save logs
     """
-    log_dir = Path(logs_dir)
-    log_dir.mkdir(exist_ok=True)
-    log_file = log_dir / "transfer_logs.json"
-    
     # Calculate metrics
     file_size_mb = round(file_size / (1024 * 1024), 2)
     duration_sec = round(duration, 2)
@@ -514,26 +885,6 @@ def log_transfer(
         "transfer_rate_mbps": speed_mbps
     }
     
-    # Read existing logs
-    transfers = []
-    if log_file.exists():
-        try:
-            with open(log_file, 'r') as f:
-                data = json.load(f)
-                transfers = data.get('transfers', [])
-        except Exception:
-            transfers = []
-    
-    # Append new log entry
-    transfers.append(log_entry)
-    
-    # Write back
-    try:
-        with open(log_file, 'w') as f:
-            json.dump({
-                "updated_at": datetime.now().isoformat(),
-                "total_transfers": len(transfers),
-                "transfers": transfers
-            }, f, indent=2)
-    except Exception as e:
-        print(f"Error writing transfer log: {e}")
+    # Hand the line to the writer thread; callers never wait on disk I/O
+    _ensure_transfer_log_writer()
+    _transfer_log_queue.put((logs_dir, orjson.dumps(log_entry) + b"\n"))
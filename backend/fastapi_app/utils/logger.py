@@ -1,7 +1,10 @@
 """
 Centralized logging configuration for CrossDrop
 """
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from pathlib import Path
 
@@ -29,13 +32,21 @@ if not logger.handlers:
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
-    logger.addHandler(console_handler)
 
     # File handler - DEBUG and above
     file_handler = logging.FileHandler(LOG_DIR / "app.log")
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(detailed_formatter)
-    logger.addHandler(file_handler)
+
+    # Callers only enqueue records; a background listener thread does the
+    # formatting and console/file I/O so request handlers never block on it
+    log_queue = queue.SimpleQueue()
+    queue_listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    queue_listener.start()
+    atexit.register(queue_listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
 # Create specific loggers for different modules
 def get_logger(name: str) -> logging.Logger:
@@ -1,14 +1,46 @@
 """
 Network utilities for device discovery and communication
 """
+import functools
 import socket
+import struct
 import json
 import platform
-from typing import Dict, Optional
+import time
+from typing import Dict, Optional, Tuple
+
+# get_local_ip() is hit by every broadcast, every received discovery packet and
+# most polled routes; re-detecting costs a socket + connect, so cache briefly
+LOCAL_IP_TTL = 5.0  # seconds
+
+# Administratively scoped multicast group for discovery: only hosts that have
+# joined it receive announcements, unlike broadcasts that every NIC on the LAN
+# has to process
+DISCOVERY_MULTICAST_GROUP = "239.255.42.99"
+_local_ip_cache: Optional[Tuple[str, float]] = None  # (ip, expires_at)
 
 
 def get_local_ip() -> str:
-    """Get the local IP address of this device"""
+    """Get the local IP address of this device (cached for LOCAL_IP_TTL seconds)"""
+    global _local_ip_cache
+    now = time.monotonic()
+    cached = _local_ip_cache
+    if cached is not None and now < cached[1]:
+        return cached[0]
+    
+    ip = _detect_local_ip()
+    _local_ip_cache = (ip, now + LOCAL_IP_TTL)
+    return ip
+
+
+def invalidate_local_ip() -> None:
+    """Force the next get_local_ip() call to re-detect the address"""
+    global _local_ip_cache
+    _local_ip_cache = None
+
+
+def _detect_local_ip() -> str:
+    """Determine the local IP address from the OS routing table"""
     try:
         # Connect to a dummy address to determine local IP
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -20,8 +52,9 @@ def get_local_ip() -> str:
         return "127.0.0.1"
 
 
+@functools.lru_cache(maxsize=1)
 def get_device_name() -> str:
-    """Get a friendly device name"""
+    """Get a friendly device name (computed once per process)"""
     hostname = socket.gethostname()
     system = platform.system()
     return f"{hostname} ({system})"
@@ -32,14 +65,23 @@ def create_broadcast_socket(port: int) -> socket.socket:
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Multicast announcements stay on the local network segment
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
     return sock
 
 
-def create_listener_socket(port: int) -> socket.socket:
-    """Create a UDP socket for listening to broadcasts"""
+def create_listener_socket(port: int, multicast_group: Optional[str] = None) -> socket.socket:
+    """Create a UDP socket for listening to broadcasts (and optionally a multicast group)"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     sock.bind(('', port))
+    if multicast_group:
+        try:
+            mreq = struct.pack("4s4s", socket.inet_aton(multicast_group), socket.inet_aton("0.0.0.0"))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        except OSError:
+            # No multicast-capable interface; broadcasts are still received
+            pass
     return sock
 
 
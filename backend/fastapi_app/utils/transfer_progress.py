@@ -1,20 +1,75 @@
 """
 Transfer progress tracking for real-time progress updates
 """
+import itertools
+import os
+import socket
 import threading
 import time
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from datetime import datetime
 
+# Minimum time between tracker updates from a throttled progress callback.
+# The UI polls a few times per second, so finer updates are wasted work.
+PROGRESS_MIN_INTERVAL = 0.05  # seconds
+
+# bytes/ns -> MB/s
+_NS_MB_PER_S = 1e9 / (1024 * 1024)
+
+# Transfer IDs only key this process's in-memory tracker, so a process-unique
+# prefix plus a counter is enough (no need for random UUIDs)
+_transfer_id_prefix = f"{os.getpid():x}-{int(time.time()):x}-"
+_transfer_id_counter = itertools.count(1)
+
+
+def new_transfer_id() -> str:
+    """Generate a transfer ID unique within this process"""
+    return _transfer_id_prefix + format(next(_transfer_id_counter), 'x')
+
 
 class TransferProgressTracker:
-    """Thread-safe progress tracker for file transfers"""
+    """Thread-safe progress tracker for file transfers
+    
+    The global lock only guards adding/removing transfers and the active index.
+    Progress updates take a per-transfer lock, and reads take no lock at all:
+    each update is applied with a single dict.update(), which CPython performs
+    atomically under the GIL, so readers copying an entry see either the old
+    or the new counters, never a mix.
+    """
     
     def __init__(self):
         self._progress: Dict[str, Dict] = {}  # transfer_id -> progress info
+        self._entry_locks: Dict[str, threading.Lock] = {}  # transfer_id -> lock for progress updates
         self._active_sockets: Dict[str, any] = {}  # transfer_id -> socket object (for cancellation)
+        # (ip, direction) -> ids of *active* transfers where ip is sender or receiver,
+        # so progress polls don't scan finished transfers
+        self._active_index: Dict[Tuple[str, str], Set[str]] = {}
         self._lock = threading.Lock()
     
+    def _index_keys(self, progress: Dict) -> Set[Tuple[str, str]]:
+        """Active-index keys for a transfer (must hold self._lock)"""
+        return {
+            (progress['sender_ip'], progress['direction']),
+            (progress['receiver_ip'], progress['direction'])
+        }
+    
+    def _unindex(self, transfer_id: str):
+        """Drop a transfer from the active index (must hold self._lock)"""
+        progress = self._progress.get(transfer_id)
+        if progress is None:
+            return
+        for key in self._index_keys(progress):
+            ids = self._active_index.get(key)
+            if ids is not None:
+                ids.discard(transfer_id)
+                if not ids:
+                    del self._active_index[key]
+    
+    def _delete(self, transfer_id: str):
+        """Drop a tracked transfer and its update lock (must hold self._lock)"""
+        del self._progress[transfer_id]
+        self._entry_locks.pop(transfer_id, None)
+    
     def create_transfer(
         self, 
         transfer_id: str, 
@@ -31,6 +86,10 @@ class TransferProgressTracker:
             socket_obj: Optional socket object for cancellation (can be set later)
         """
         with self._lock:
+            if transfer_id in self._progress:
+                self._unindex(transfer_id)
+                self._delete(transfer_id)
+            now = time.time()
             self._progress[transfer_id] = {
                 'direction': direction,
                 'sender_ip': sender_ip,
@@ -40,12 +99,15 @@ class TransferProgressTracker:
                 'bytes_transferred': 0,
                 'progress_percent': 0.0,
                 'speed': 0.0,  # MB/s
-                'start_time': time.time(),
-                'last_update': time.time(),
+                'start_time': now,
+                'last_update': now,
                 'status': 'active',  # 'active', 'completed', 'failed', 'cancelled'
                 'last_bytes': 0,
-                'last_time': time.time()
+                'last_time_ns': time.monotonic_ns()  # Speed is timed on the monotonic clock
             }
+            for key in self._index_keys(self._progress[transfer_id]):
+                self._active_index.setdefault(key, set()).add(transfer_id)
+            self._entry_locks[transfer_id] = threading.Lock()
             if socket_obj:
                 self._active_sockets[transfer_id] = socket_obj
     
@@ -54,57 +116,82 @@ class TransferProgressTracker:
         transfer_id: str, 
         bytes_transferred: int
     ):
-        """Update transfer progress"""
-        with self._lock:
-            if transfer_id not in self._progress:
-                return
-            
-            progress = self._progress[transfer_id]
-            progress['bytes_transferred'] = bytes_transferred
-            
+        """Update transfer progress (takes only this transfer's lock)"""
+        progress = self._progress.get(transfer_id)
+        lock = self._entry_locks.get(transfer_id)
+        if progress is None or lock is None:
+            return
+        
+        with lock:
             # Calculate progress percentage
             if progress['file_size'] > 0:
-                progress['progress_percent'] = (bytes_transferred / progress['file_size']) * 100
+                progress_percent = (bytes_transferred / progress['file_size']) * 100
             else:
-                progress['progress_percent'] = 0.0
+                progress_percent = 0.0
             
-            # Calculate speed (MB/s)
-            current_time = time.time()
-            time_delta = current_time - progress['last_time']
+            # Calculate speed (MB/s); the monotonic clock can't step backwards
+            # under NTP adjustments the way time.time() can
+            current_time_ns = time.monotonic_ns()
+            time_delta_ns = current_time_ns - progress['last_time_ns']
             bytes_delta = bytes_transferred - progress['last_bytes']
             
-            if time_delta > 0:
-                progress['speed'] = (bytes_delta / (1024 * 1024)) / time_delta
+            if time_delta_ns > 0:
+                speed = bytes_delta * _NS_MB_PER_S / time_delta_ns
             else:
-                progress['speed'] = 0.0
+                speed = 0.0
             
-            progress['last_update'] = current_time
-            progress['last_bytes'] = bytes_transferred
-            progress['last_time'] = current_time
+            # One update() so lock-free readers never see a partial update
+            progress.update({
+                'bytes_transferred': bytes_transferred,
+                'progress_percent': progress_percent,
+                'speed': speed,
+                'last_update': time.time(),
+                'last_bytes': bytes_transferred,
+                'last_time_ns': current_time_ns
+            })
     
-    def get_progress(self, transfer_id: str) -> Optional[Dict]:
-        """Get current progress for a transfer"""
+    def throttled_updater(self, transfer_id: str, min_interval: float = PROGRESS_MIN_INTERVAL) -> Callable[[int], None]:
+        """Get a progress callback for a transfer that coalesces updates
+        
+        At most one update_progress() per min_interval reaches the tracker;
+        the final byte count (reaching file_size) is always applied.
+        """
         with self._lock:
-            return self._progress.get(transfer_id)
+            progress = self._progress.get(transfer_id)
+            file_size = progress['file_size'] if progress else 0
+        last_update = [0.0]
+        
+        def update(bytes_transferred: int):
+            now = time.monotonic()
+            if now - last_update[0] >= min_interval or (file_size > 0 and bytes_transferred >= file_size):
+                last_update[0] = now
+                self.update_progress(transfer_id, bytes_transferred)
+        
+        return update
     
-    def get_transfers_by_ip(self, ip: str, direction: Optional[str] = None) -> list:
-        """Get all transfers for a specific IP address"""
-        with self._lock:
-            results = []
-            for transfer_id, progress in self._progress.items():
-                # Check if IP is sender or receiver
-                if progress['sender_ip'] == ip or progress['receiver_ip'] == ip:
-                    if direction is None or progress['direction'] == direction:
-                        results.append({
-                            'transfer_id': transfer_id,
-                            **progress
-                        })
-            return results
+    def get_progress(self, transfer_id: str) -> Optional[Dict]:
+        """Get a copy of the current progress for a transfer (lock-free)"""
+        progress = self._progress.get(transfer_id)
+        return dict(progress) if progress is not None else None
+    
+    def get_active_transfers(self, ip: str, direction: str) -> List[Dict]:
+        """Get active transfers for an IP address in one direction (indexed, lock-free)"""
+        results = []
+        # tuple() copies the id set atomically; entries removed since are skipped
+        for transfer_id in tuple(self._active_index.get((ip, direction), ())):
+            progress = self._progress.get(transfer_id)
+            if progress is not None:
+                results.append({
+                    'transfer_id': transfer_id,
+                    **progress
+                })
+        return results
     
     def complete_transfer(self, transfer_id: str):
         """Mark transfer as completed"""
         with self._lock:
             if transfer_id in self._progress:
+                self._unindex(transfer_id)
                 self._progress[transfer_id]['status'] = 'completed'
                 self._progress[transfer_id]['progress_percent'] = 100.0
     
@@ -112,6 +199,7 @@ class TransferProgressTracker:
         """Mark transfer as failed"""
         with self._lock:
             if transfer_id in self._progress:
+                self._unindex(transfer_id)
                 self._progress[transfer_id]['status'] = 'failed'
     
     def set_socket(self, transfer_id: str, socket_obj: any):
@@ -135,11 +223,17 @@ class TransferProgressTracker:
                 return False
             
             # Mark as cancelled
+            self._unindex(transfer_id)
             progress['status'] = 'cancelled'
             
-            # Close socket if available
+            # Close socket if available. Shut it down first: close() alone
+            # doesn't wake a thread blocked in recv/splice/send on it
             if transfer_id in self._active_sockets:
                 sock = self._active_sockets[transfer_id]
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except Exception:
+                    pass
                 try:
                     sock.close()
                 except Exception:
@@ -148,7 +242,7 @@ class TransferProgressTracker:
             
             # Remove cancelled transfer immediately (don't keep it around)
             # This prevents it from showing up in progress polls
-            del self._progress[transfer_id]
+            self._delete(transfer_id)
             
             return True
     
@@ -156,7 +250,8 @@ class TransferProgressTracker:
         """Remove transfer (after cleanup delay)"""
         with self._lock:
             if transfer_id in self._progress:
-                del self._progress[transfer_id]
+                self._unindex(transfer_id)
+                self._delete(transfer_id)
             if transfer_id in self._active_sockets:
                 del self._active_sockets[transfer_id]
     
@@ -171,7 +266,7 @@ class TransferProgressTracker:
                     to_remove.append(transfer_id)
             
             for transfer_id in to_remove:
-                del self._progress[transfer_id]
+                self._delete(transfer_id)
 
 
 # Global instance
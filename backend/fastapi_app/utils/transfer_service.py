@@ -1,123 +1,159 @@
 """
 Transfer service that manages TCP file transfer server in background
 """
+import asyncio
+import logging
 import os
 import socket
-import threading
+import struct
 import time
-import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Set
 
 from utils.file_handler import receive_file, log_transfer, get_downloads_folder
+from utils.logger import get_logger
 from utils.network_utils import get_local_ip
-from utils.transfer_progress import progress_tracker
+from utils.transfer_progress import progress_tracker, new_transfer_id
+
+logger = get_logger("transfer_service")
+
+# Receive progress is logged every PROGRESS_LOG_BYTES or PROGRESS_LOG_INTERVAL_NS,
+# whichever comes first (integers, so the per-callback check needs no float math)
+PROGRESS_LOG_BYTES = 5 * 1024 * 1024
+PROGRESS_LOG_INTERVAL_NS = 2_000_000_000
 
 
 class TransferService:
     """Service for handling incoming file transfers via TCP"""
     
     TRANSFER_PORT = 9000
+    LISTEN_BACKLOG = 128  # Queued pending connections; 5 overflowed when several peers sent at once
+    MAX_CONCURRENT_RECEIVES = 16  # Receive threads; further connections wait in the listen backlog
     
     def __init__(self, logs_dir: str = "logs", connection_manager=None):
         self.logs_dir = logs_dir
         self.local_ip = get_local_ip()
         self.connection_manager = connection_manager  # For security validation
+        self.downloads_folder = str(get_downloads_folder())  # Where received files are saved
         self.server_socket: Optional[socket.socket] = None
-        self.server_thread: Optional[threading.Thread] = None
+        self._accept_task: Optional[asyncio.Task] = None
+        self._client_pool: Optional[ThreadPoolExecutor] = None
+        self._receive_slots: Optional[asyncio.Semaphore] = None
+        self._active_socks: Set[socket.socket] = set()  # Connections being received
         self.running = False
         self.received_count = 0
     
-    def start(self):
-        """Start the TCP file transfer server in a background thread"""
+    async def start(self):
+        """Start the TCP file transfer server (accepting on the running event loop)"""
         if self.running:
             return
         
-        self.running = True
-        self.server_thread = threading.Thread(
-            target=self._server_loop,
-            daemon=True,
-            name="TransferServer"
+        try:
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.bind(('0.0.0.0', self.TRANSFER_PORT))
+            server_socket.listen(self.LISTEN_BACKLOG)
+            server_socket.setblocking(False)  # The event loop waits for connections
+        except Exception as e:
+            logger.error(f"Failed to start transfer server: {e}")
+            return
+        
+        self.server_socket = server_socket
+        self._client_pool = ThreadPoolExecutor(
+            max_workers=self.MAX_CONCURRENT_RECEIVES,
+            thread_name_prefix="transfer-recv"
         )
-        self.server_thread.start()
-        print(f"Transfer server started on port {self.TRANSFER_PORT}")
+        self._receive_slots = asyncio.Semaphore(self.MAX_CONCURRENT_RECEIVES)
+        self.running = True
+        self._accept_task = asyncio.create_task(self._accept_loop(server_socket))
+        logger.info(f"TCP file transfer server listening on {self.local_ip}:{self.TRANSFER_PORT}")
     
     def stop(self):
         """Stop the TCP file transfer server"""
         self.running = False
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except Exception:
-                pass
+        if self._accept_task is not None:
+            # The accept loop closes the listening socket as it unwinds
+            self._accept_task.cancel()
+            self._accept_task = None
+        if self._client_pool is not None:
+            # Pool threads are joined at interpreter exit, so abort receives in
+            # progress rather than letting them hold up shutdown
+            for client_sock in list(self._active_socks):
+                try:
+                    client_sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._client_pool.shutdown(wait=False)
+            self._client_pool = None
     
-    def _server_loop(self):
-        """Main server loop that accepts connections and receives files"""
+    async def _accept_loop(self, server_socket: socket.socket):
+        """Accept connections as the event loop reports them; each authorized
+        transfer is received on a thread from the client pool"""
+        loop = asyncio.get_running_loop()
+        client_pool = self._client_pool
+        receive_slots = self._receive_slots
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind(('0.0.0.0', self.TRANSFER_PORT))
-            self.server_socket.listen(5)
-            self.server_socket.settimeout(1.0)  # Non-blocking with timeout
-            
-            print(f"TCP file transfer server listening on {self.local_ip}:{self.TRANSFER_PORT}")
-            
             while self.running:
+                # Only accept while a receive thread is free: beyond that,
+                # senders wait in the listen backlog for their acknowledgment
+                await receive_slots.acquire()
                 try:
-                    client_sock, client_addr = self.server_socket.accept()
-                    print(f"📥 Incoming file transfer from {client_addr[0]}")
-                    
-                    # Handle each connection in a separate thread
-                    client_thread = threading.Thread(
-                        target=self._handle_client,
-                        args=(client_sock, client_addr),
-                        daemon=True
-                    )
-                    client_thread.start()
-                    
-                except socket.timeout:
-                    # Timeout is expected, continue listening
-                    continue
+                    client_sock, client_addr = await loop.sock_accept(server_socket)
+                except asyncio.CancelledError:
+                    receive_slots.release()
+                    raise
                 except Exception as e:
+                    receive_slots.release()
                     if self.running:
-                        print(f"Server error: {e}")
+                        logger.error(f"Server error: {e}")
+                        await asyncio.sleep(0.1)  # e.g. out of file descriptors; don't spin
                     continue
-        except Exception as e:
-            print(f"Failed to start transfer server: {e}")
-            self.running = False
+                
+                logger.info(f"📥 Incoming file transfer from {client_addr[0]}")
+                
+                # SECURITY: Only accept files from connected peers. Checked here so
+                # rejected connections never get a thread.
+                if self.connection_manager and not self.connection_manager.is_connected(client_addr[0]):
+                    logger.warning(f"⚠️ SECURITY: Rejecting file transfer from unauthorized device: {client_addr[0]} (only accepting files from accepted connections)")
+                    try:
+                        # Zero linger: close() resets the connection instead of
+                        # leaving it in TIME_WAIT, so repeated attempts don't pile up
+                        client_sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                    except OSError:
+                        pass
+                    client_sock.close()
+                    receive_slots.release()
+                    continue
+                
+                # The receive path is blocking (splice/recv_into), so it runs on
+                # a pool thread; _handle_client sets the socket's own timeout
+                receive = loop.run_in_executor(client_pool, self._handle_client, client_sock, client_addr)
+                receive.add_done_callback(lambda _: receive_slots.release())
         finally:
-            if self.server_socket:
-                try:
-                    self.server_socket.close()
-                except Exception:
-                    pass
+            try:
+                server_socket.close()
+            except Exception:
+                pass
     
     def _handle_client(self, client_sock: socket.socket, client_addr: tuple):
-        """Handle a single client connection"""
-        start_time = time.time()
+        """Handle a single client connection (already authorized by the accept loop)"""
+        start_time = time.perf_counter()  # Only used for the duration
         sender_ip = client_addr[0]
-        
-        # SECURITY: Only accept files from connected peers
-        if self.connection_manager:
-            if not self.connection_manager.is_connected(sender_ip):
-                print(f"⚠️ SECURITY: Rejecting file transfer from unauthorized device: {sender_ip}")
-                print(f"   Only accepting files from accepted connections.")
-                try:
-                    client_sock.close()
-                except Exception:
-                    pass
-                return
+        self._active_socks.add(client_sock)
         
         try:
             client_sock.settimeout(60)  # 60 second timeout per file
             
             transfer_id = None
+            receive_info = {'filename': 'unknown', 'file_size': 0}
+            push_progress = None  # Throttled tracker update, created with the transfer
             
             # Metadata callback to create progress tracker
             def on_metadata(filename: str, file_size: int):
-                nonlocal transfer_id
-                transfer_id = str(uuid.uuid4())
+                nonlocal transfer_id, push_progress
+                transfer_id = new_transfer_id()
                 progress_tracker.create_transfer(
                     transfer_id=transfer_id,
                     direction='receive',
@@ -128,97 +164,98 @@ class TransferService:
                 )
                 # Store socket for cancellation now that transfer_id is available
                 progress_tracker.set_socket(transfer_id, client_sock)
+                push_progress = progress_tracker.throttled_updater(transfer_id)
+                receive_info['filename'] = filename
+                receive_info['file_size'] = file_size
                 
-                # Print initial receiving info
-                file_size_mb = file_size / (1024 * 1024) if file_size > 0 else 0
+                # Log initial receiving info
                 if file_size > 0:
-                    print(f"📥 Starting to receive: {filename} ({file_size_mb:.2f} MB) from {sender_ip}")
+                    size_text = f"{file_size / (1024 * 1024):.2f} MB"
                 else:
-                    print(f"📥 Starting to receive: {filename} (size unknown) from {sender_ip}")
-                print(f"   📁 Saving to: {get_downloads_folder()}")
+                    size_text = "size unknown"
+                logger.info(f"📥 Starting to receive: {filename} ({size_text}) from {sender_ip}, saving to {self.downloads_folder}")
             
-            # Track last printed progress for terminal output
-            last_printed_progress = {'bytes': 0, 'time': start_time}
+            # Track last logged progress for terminal output
+            last_printed_bytes = 0
+            last_printed_ns = time.monotonic_ns()
             
-            # Progress callback
+            # Progress callback: the tracker update is throttled and the terminal
+            # output is computed from local counters, so no tracker reads per chunk
             def update_receive_progress(bytes_received: int):
-                nonlocal last_printed_progress
-                if transfer_id:
-                    progress_tracker.update_progress(transfer_id, bytes_received)
+                nonlocal last_printed_bytes, last_printed_ns
+                if push_progress is None:
+                    return
+                push_progress(bytes_received)
+                
+                current_ns = time.monotonic_ns()
+                time_delta_ns = current_ns - last_printed_ns
+                bytes_delta = bytes_received - last_printed_bytes
+                
+                if (bytes_delta >= PROGRESS_LOG_BYTES or time_delta_ns >= PROGRESS_LOG_INTERVAL_NS) and logger.isEnabledFor(logging.INFO):
+                    file_size = receive_info['file_size']
+                    filename = receive_info['filename']
+                    # Floats only from here on, when a line is actually logged
+                    speed = bytes_delta * 1e9 / (1024 * 1024) / time_delta_ns if time_delta_ns > 0 else 0.0
+                    
+                    # Format output
+                    received_mb = bytes_received / (1024 * 1024)
+                    total_mb = file_size / (1024 * 1024) if file_size > 0 else 0
                     
-                    # Get progress info from tracker for detailed logging
-                    progress_info = progress_tracker.get_progress(transfer_id)
-                    if progress_info:
-                        current_time = time.time()
-                        time_delta = current_time - last_printed_progress['time']
-                        bytes_delta = bytes_received - last_printed_progress['bytes']
-                        
-                        # Print progress every 5MB or every 2 seconds, whichever comes first
-                        if (bytes_delta >= 5 * 1024 * 1024) or (time_delta >= 2.0):
-                            file_size = progress_info.get('file_size', 0)
-                            progress_percent = progress_info.get('progress_percent', 0)
-                            speed = progress_info.get('speed', 0)
-                            filename = progress_info.get('filename', 'unknown')
-                            
-                            # Format output
-                            received_mb = bytes_received / (1024 * 1024)
-                            total_mb = file_size / (1024 * 1024) if file_size > 0 else 0
-                            
-                            if file_size > 0:
-                                print(f"📥 Receiving: {filename}")
-                                print(f"   Progress: {progress_percent:.1f}% | {received_mb:.2f} MB / {total_mb:.2f} MB | Speed: {speed:.2f} MB/s")
-                            else:
-                                print(f"📥 Receiving: {filename}")
-                                print(f"   Progress: {received_mb:.2f} MB received | Speed: {speed:.2f} MB/s")
-                            
-                            last_printed_progress = {'bytes': bytes_received, 'time': current_time}
+                    if file_size > 0:
+                        progress_percent = bytes_received / file_size * 100
+                        logger.info(f"📥 Receiving: {filename} | {progress_percent:.1f}% | {received_mb:.2f} MB / {total_mb:.2f} MB | Speed: {speed:.2f} MB/s")
+                    else:
+                        logger.info(f"📥 Receiving: {filename} | {received_mb:.2f} MB received | Speed: {speed:.2f} MB/s")
+                    
+                    last_printed_bytes = bytes_received
+                    last_printed_ns = current_ns
             
             # Store socket for cancellation (will be set after metadata is received)
             # Note: transfer_id is created in on_metadata callback
             
             # Receive the file to Downloads folder with progress tracking
-            downloads_folder = get_downloads_folder()
             file_path, file_size = receive_file(
                 client_sock, 
-                str(downloads_folder), 
+                self.downloads_folder, 
                 progress_callback=update_receive_progress,
                 metadata_callback=on_metadata
             )
             
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             
-            # Check if transfer was cancelled
-            if transfer_id:
-                progress_info = progress_tracker.get_progress(transfer_id)
-                if progress_info and progress_info.get('status') == 'cancelled':
-                    print(f"🚫 File receive cancelled by user")
-                    if file_path and os.path.exists(file_path):
-                        try:
-                            os.remove(file_path)  # Delete partial file
-                            print(f"   🗑️  Deleted partial file: {file_path}")
-                        except Exception as e:
-                            print(f"   ⚠️  Could not delete partial file: {e}")
-                    return
+            # Check if transfer was cancelled: cancel_transfer() shuts the socket
+            # down and drops the tracker entry. With an unknown size the shutdown
+            # reads as a normal end of stream, so a "successful" receive can
+            # have been cancelled too.
+            if transfer_id and progress_tracker.get_progress(transfer_id) is None:
+                logger.info("🚫 File receive cancelled by user")
+                partial_path = file_path or os.path.join(self.downloads_folder, receive_info['filename'])
+                if os.path.exists(partial_path):
+                    try:
+                        os.remove(partial_path)  # Delete partial file
+                        logger.info(f"🗑️ Deleted partial file: {partial_path}")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not delete partial file: {e}")
+                return
             
             if file_path and file_size:
+                # The throttled updates may have skipped the last chunk of a
+                # stream of unknown size, so record the final count explicitly
+                progress_tracker.update_progress(transfer_id, file_size)
                 progress_tracker.complete_transfer(transfer_id)
                 self.received_count += 1
                 filename = Path(file_path).name
                 
-                # Get final progress info
-                progress_info = progress_tracker.get_progress(transfer_id)
                 avg_speed = 0
-                if progress_info and duration > 0:
+                if duration > 0:
                     avg_speed = (file_size / (1024 * 1024)) / duration
                 
                 file_size_mb = file_size / (1024 * 1024)
-                print(f"\n✓ File received successfully!")
-                print(f"   📄 Filename: {filename}")
-                print(f"   📊 Size: {file_size_mb:.2f} MB ({file_size:,} bytes)")
-                print(f"   ⏱️  Duration: {duration:.2f} seconds")
-                print(f"   🚀 Average Speed: {avg_speed:.2f} MB/s")
-                print(f"   📁 Saved to: {file_path}")
-                print(f"   👤 From: {sender_ip}\n")
+                logger.info(
+                    f"✅ File received successfully: {filename} | "
+                    f"{file_size_mb:.2f} MB ({file_size:,} bytes) in {duration:.2f}s | "
+                    f"Average Speed: {avg_speed:.2f} MB/s | From: {sender_ip} | Saved to: {file_path}"
+                )
                 
                 # Log successful transfer
                 log_transfer(
@@ -231,18 +268,16 @@ class TransferService:
                     logs_dir=self.logs_dir
                 )
             elif file_path is None and file_size is None:
-                # Transfer was cancelled or connection closed prematurely
+                # Cancelled by the sender or connection closed prematurely
                 if transfer_id:
-                    progress_info = progress_tracker.get_progress(transfer_id)
-                    if progress_info and progress_info.get('status') != 'cancelled':
-                        progress_tracker.fail_transfer(transfer_id)
-                    print(f"🚫 File receive cancelled or connection closed")
+                    progress_tracker.fail_transfer(transfer_id)
+                    logger.info("🚫 File receive cancelled or connection closed")
                 else:
-                    print(f"✗ Failed to receive file from {sender_ip} (connection closed)")
+                    logger.warning(f"⚠️ Failed to receive file from {sender_ip} (connection closed)")
             else:
                 if transfer_id:
                     progress_tracker.fail_transfer(transfer_id)
-                print(f"✗ Failed to receive file from {sender_ip}")
+                logger.warning(f"⚠️ Failed to receive file from {sender_ip}")
                 log_transfer(
                     sender_ip=sender_ip,
                     receiver_ip=self.local_ip,
@@ -253,10 +288,10 @@ class TransferService:
                     logs_dir=self.logs_dir
                 )
         except Exception as e:
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             if 'transfer_id' in locals():
                 progress_tracker.fail_transfer(transfer_id)
-            print(f"Error handling client {sender_ip}: {e}")
+            logger.error(f"Error handling client {sender_ip}: {e}")
             log_transfer(
                 sender_ip=sender_ip,
                 receiver_ip=self.local_ip,
@@ -267,6 +302,7 @@ class TransferService:
                 logs_dir=self.logs_dir
             )
         finally:
+            self._active_socks.discard(client_sock)
             try:
                 client_sock.close()
             except Exception:
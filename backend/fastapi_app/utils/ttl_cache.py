@@ -0,0 +1,33 @@
+"""
+Short-lived response cache for endpoints the UI polls
+"""
+import time
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Caches one computed value, reused while its key matches and it has not expired
+
+    Routes key the cache on whatever the value depends on (e.g. a state version
+    and the local IP), so a mutation invalidates it immediately and the TTL
+    only bounds staleness for state without a version counter.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entry: Optional[Tuple[Hashable, float, Any]] = None  # (key, expires_at, value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it if missing or stale"""
+        now = time.monotonic()
+        entry = self._entry
+        if entry is not None and entry[0] == key and now < entry[1]:
+            return entry[2]
+
+        value = compute()
+        self._entry = (key, now + self.ttl, value)
+        return value
+
+    def clear(self):
+        """Drop the cached value"""
+        self._entry = None
@@ -151,6 +151,44 @@ export const disconnect = async (peerIp) => {
   }
 };
 
+// Same host as the REST API; an empty base URL means the API is on this origin
+const getEventsUrl = () => {
+  if (API_BASE_URL) {
+    return `${API_BASE_URL.replace('http://', 'ws://').replace('https://', 'wss://')}/connections/events`;
+  }
+  const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+  return `${wsProtocol}//${window.location.host}/connections/events`;
+};
+
+/**
+ * Subscribe to connection events (incoming requests, accepts, rejects, disconnects)
+ */
+export const subscribeConnectionEvents = ({
+  onOpen = () => {},
+  onEvent = () => {},
+  onClose = () => {}
+} = {}) => {
+  const ws = new WebSocket(getEventsUrl());
+
+  ws.onopen = () => onOpen(ws);
+
+  ws.onmessage = (event) => {
+    try {
+      onEvent(JSON.parse(event.data));
+    } catch (error) {
+      console.error('Error parsing connection event:', error);
+    }
+  };
+
+  ws.onclose = (event) => onClose(event);
+
+  ws.onerror = (error) => {
+    console.error('Connection events error:', error);
+  };
+
+  return ws;
+};
+
 export const getConnectionStatus = async (peerIp) => {
   try {
     const response = await api.get(`/connections/status/${peerIp}`);
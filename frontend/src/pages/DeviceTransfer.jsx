@@ -12,7 +12,8 @@ import {
   getTransferHistory,
   disconnect,
   startDiscovery,
-  stopDiscovery
+  stopDiscovery,
+  subscribeConnectionEvents
 } from '../api/backend';
 import config from '../config';
 
@@ -26,6 +27,7 @@ const DeviceTransfer = () => {
   const [connectionStatuses, setConnectionStatuses] = useState({});
   const [pendingRequests, setPendingRequests] = useState([]);
   const [requesting, setRequesting] = useState({});
+  const [eventsConnected, setEventsConnected] = useState(false);
 
   // Connection state
   const [connections, setConnections] = useState([]);
@@ -220,6 +222,35 @@ const DeviceTransfer = () => {
     }
   };
 
+  // Connection changes are pushed over /connections/events; each event
+  // refetches the lists, and polling covers anything the socket misses
+  const fetchDiscoveryDataRef = useRef(fetchDiscoveryData);
+  fetchDiscoveryDataRef.current = fetchDiscoveryData;
+
+  useEffect(() => {
+    let ws;
+    let reconnectTimer;
+    let closed = false;
+
+    const connect = () => {
+      ws = subscribeConnectionEvents({
+        onOpen: () => setEventsConnected(true),
+        onEvent: () => fetchDiscoveryDataRef.current(),
+        onClose: () => {
+          setEventsConnected(false);
+          if (!closed) reconnectTimer = setTimeout(connect, 5000);
+        }
+      });
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
+      ws.close();
+    };
+  }, []);
+
   // Separate polling intervals for different data types
   useEffect(() => {
     fetchDiscoveryData();
@@ -229,8 +260,9 @@ const DeviceTransfer = () => {
     let historyInterval;
 
     if (autoRefresh) {
-      // Poll discovery/connection data every 5 seconds (was 2s - too aggressive)
-      discoveryInterval = setInterval(fetchDiscoveryData, 5000);
+      // Poll discovery/connection data every 5 seconds (was 2s - too aggressive).
+      // Peer discovery isn't pushed, so keep polling slowly while events arrive
+      discoveryInterval = setInterval(fetchDiscoveryData, eventsConnected ? 15000 : 5000);
 
       // Poll transfer history less frequently - every 10 seconds
       historyInterval = setInterval(fetchTransferHistory, 10000);
@@ -240,7 +272,7 @@ const DeviceTransfer = () => {
       if (discoveryInterval) clearInterval(discoveryInterval);
       if (historyInterval) clearInterval(historyInterval);
     };
-  }, [autoRefresh]);
+  }, [autoRefresh, eventsConnected]);
 
   // Separate effect for transfer progress polling - only when actively transferring
   useEffect(() => {
@@ -275,14 +307,10 @@ const DeviceTransfer = () => {
   const handleRequestConnection = async (peerIp, peerName) => {
     setRequesting({ ...requesting, [peerIp]: true });
     try {
-      const result = await requestConnection(peerIp);
-
-      if (result.request_delivered) {
-        toast.success(`Connection request sent to ${peerName}`);
-      } else {
-        toast.success(`Connection requested to ${peerName}`, { duration: 3000 });
-        toast('Request may take a moment to reach the device', { duration: 4000 });
-      }
+      // The request is delivered to the peer in the background, so the
+      // response can't say whether it arrived yet
+      await requestConnection(peerIp);
+      toast.success(`Connection request sent to ${peerName}`);
 
       // Poll for connection status updates
       fetchDiscoveryData();
@@ -375,9 +403,8 @@ const DeviceTransfer = () => {
       estimatedTimeRemaining: 0
     });
 
-    const formData = new FormData();
-    formData.append('file', selectedFile);
-    formData.append('target_ip', targetIp);
+    // Send the raw file body so the backend can relay it to the peer as it uploads
+    const params = new URLSearchParams({ target_ip: targetIp, filename: selectedFile.name });
 
     const xhr = new XMLHttpRequest();
 
@@ -419,8 +446,8 @@ const DeviceTransfer = () => {
       setSending(false);
     });
 
-    xhr.open('POST', `${config.API_BASE_URL}/transfer/send`);
-    xhr.send(formData);
+    xhr.open('POST', `${config.API_BASE_URL}/transfer/send-stream?${params}`);
+    xhr.send(selectedFile);
   };
 
   const handleDisconnect = async (peerIp, peerName) => {
@@ -66,15 +66,15 @@ const FileTransfer = () => {
     setTransferStatus('Uploading file to server...');
 
     try {
-      // First, upload the file to backend temp location
-      const formData = new FormData();
-      formData.append('file', selectedFile);
-      formData.append('target_ip', selectedDevice.peer_ip);
-
-      // Upload and send file in one step
-      const uploadResponse = await fetch(`${config.API_BASE_URL}/transfer/send`, {
+      // Upload and send file in one step: the backend relays the raw body
+      // to the peer as it arrives
+      const params = new URLSearchParams({
+        target_ip: selectedDevice.peer_ip,
+        filename: selectedFile.name,
+      });
+      const uploadResponse = await fetch(`${config.API_BASE_URL}/transfer/send-stream?${params}`, {
         method: 'POST',
-        body: formData,
+        body: selectedFile,
       });
 
       if (!uploadResponse.ok) {